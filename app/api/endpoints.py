@@ -98,36 +98,136 @@
 
 #     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 #     return FileResponse(csv_file, media_type="text/csv", filename=f"lcr_measurements_{timestamp}.csv")
-from fastapi import APIRouter, Request
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import ValidationError
+import asyncio
 import csv
 import io
+import json
 from datetime import datetime
-
-from app.services.measurement import (
-    get_measurements,
-    start_measurement,
-    stop_measurement,
-    update_config,
-    get_config,
-    export_to_csv,
-)
-from app.services.meter import connect_to_meter, disconnect_meter, send_command
+from typing import Literal, Optional
+
+from app.services.measurement import Device, query_history, export_history, list_sessions, get_session_data
+from app.services.circuit import parse_quantities
+from app.services.devices import devices, DEFAULT_DEVICE
+from app.services.stream import drain
+from app.services.export import EXPORT_FORMATS
+from app.services.sweep import SweepJob, sweep_frequencies
+from app.services.profiler import profiler
+from app.services.ports import port_inventory
+from app.services.serialize import COLUMNAR_MEDIA_TYPE, dumps
+from app.services.sorting import Sorter
+from app.models.schemas import ConnectionRequest, MeasurementConfig, SessionRequest, SortConfig, SweepConfig
 
 router = APIRouter()
 
+# Routes for a single meter, mounted at /api for the default device and at
+# /api/devices/{device_id} for every device
+device_router = APIRouter()
+
+# Live stream batching: at most one message per interval per client
+STREAM_BATCH_INTERVAL = 0.1
+STREAM_BATCH_SIZE = 500
+
+
+def validation_message(error: ValidationError) -> str:
+    """What failed validation, as a one-line message with the first problem of each field"""
+    problems = {}
+    for e in error.errors():
+        problems.setdefault(e["loc"][0] if e["loc"] else "", e["msg"])
+    return "; ".join(f"{field}: {message}" if field != "" else message for field, message in problems.items())
+
+
+def get_device(device_id: str = DEFAULT_DEVICE) -> Device:
+    device = devices.get(device_id)
+    if device is None:
+        raise HTTPException(status_code=404, detail=f"Unknown device {device_id}")
+    return device
+
+
+@router.get("/ports")
+async def list_ports():
+    return JSONResponse(port_inventory.info())
+
+
+@router.post("/ports/refresh")
+async def refresh_ports():
+    await port_inventory.refresh()
+    return JSONResponse(port_inventory.info())
 
-@router.post("/connect")
-async def connect(request: Request):
-    data = await request.json()
-    port = data.get("port")
+
+@router.get("/devices")
+async def list_devices():
+    return JSONResponse([device.info() for device in devices.list()])
+
+
+@router.post("/devices")
+async def add_device(request: Request):
+    try:
+        data = ConnectionRequest.model_validate(await request.json())
+    except ValidationError as e:
+        return JSONResponse({"success": False, "message": f"Invalid request: {validation_message(e)}"})
+    port = data.port
     if not port:
         return JSONResponse({"success": False, "message": "No port selected"})
 
-    success, message = connect_to_meter(port)
+    success, result = await devices.add(port, data.id, data.baudrate)
+    if not success:
+        return JSONResponse({"success": False, "message": result})
+    device = devices.get(result)
+    device_id = await device.meter.send_command(65)
+    return JSONResponse({"success": True, "message": f"Connected to {port}", "id": result, "instrument_id": device_id})
+
+
+@router.delete("/devices/{device_id}")
+async def remove_device(device_id: str):
+    success, message = await devices.remove(device_id)
+    return JSONResponse({"success": success, "message": message})
+
+
+@router.post("/profile/start")
+async def start_profile(seconds: float = Query(10.0, gt=0, le=300), interval: float = Query(0.005, ge=0.001, le=1.0)):
+    if profiler.is_running:
+        return JSONResponse({"success": False, "message": "Profiler already running"})
+    profiler.start(seconds, interval)
+    return JSONResponse({"success": True, "message": f"Profiling for {seconds} s"})
+
+
+@router.post("/profile/stop")
+async def stop_profile():
+    await asyncio.to_thread(profiler.stop)
+    return JSONResponse({"success": True, "message": "Profiler stopped", **profiler.status()})
+
+
+@router.get("/profile/status")
+async def profile_status():
+    return JSONResponse(profiler.status())
+
+
+@router.get("/profile")
+async def get_profile():
+    """Collapsed stacks of the last profiling window, for flamegraph.pl or speedscope"""
+    return PlainTextResponse(profiler.report())
+
+
+@device_router.post("/connect")
+async def connect(request: Request, device: Device = Depends(get_device)):
+    try:
+        data = ConnectionRequest.model_validate(await request.json())
+    except ValidationError as e:
+        return JSONResponse({"success": False, "message": f"Invalid request: {validation_message(e)}"})
+    port, baudrate = data.port, data.baudrate
+    if not port:
+        return JSONResponse({"success": False, "message": "No port selected"})
+
+    success, message = await device.meter.connect(port, 9600 if baudrate == "auto" else baudrate)
     if success:
-        device_name = send_command(64)
-        device_id = send_command(65)
+        if baudrate == "auto":
+            link = await device.autotune()
+            message = f"{message} ({link['message']})"
+        device_name = await device.meter.send_command(64)
+        device_id = await device.meter.send_command(65)
         return JSONResponse(
             {
                 "success": True,
@@ -138,47 +238,334 @@ async def connect(request: Request):
     return JSONResponse({"success": False, "message": message})
 
 
-@router.post("/disconnect")
-async def disconnect():
-    success, message = disconnect_meter()
+@device_router.post("/autotune")
+async def autotune(device: Device = Depends(get_device)):
+    return JSONResponse(await device.autotune())
+
+
+@device_router.get("/link")
+async def link_stats(device: Device = Depends(get_device)):
+    return JSONResponse(
+        {
+            "port": device.meter.transport.port,
+            "baudrate": device.meter.transport.baudrate,
+            "connected": device.meter.is_connected,
+            "lost": device.meter.transport.lost,
+            "skipped_bytes": device.meter.skipped_bytes,
+            **device.meter.transport.counters(),
+            "autotune": device.meter.link_stats,
+        }
+    )
+
+
+@device_router.post("/disconnect")
+async def disconnect(device: Device = Depends(get_device)):
+    success, message = await device.meter.disconnect()
     return JSONResponse({"success": success, "message": message})
 
 
-@router.get("/get_config")
-async def get_current_config():
-    return JSONResponse(get_config())
+@device_router.get("/get_config")
+async def get_current_config(device: Device = Depends(get_device)):
+    return JSONResponse(device.get_config())
 
 
-@router.post("/set_config")
-async def set_config(request: Request):
+@device_router.post("/set_config")
+async def set_config(request: Request, device: Device = Depends(get_device)):
     config = await request.json()
-    update_config(config)
+    if not isinstance(config, dict):
+        return JSONResponse({"success": False, "message": "Invalid configuration: expected an object"})
+    try:
+        config = MeasurementConfig.model_validate({**device.get_config(), **config})
+    except ValidationError as e:
+        return JSONResponse({"success": False, "message": f"Invalid configuration: {validation_message(e)}"})
+    await device.update_config(config.model_dump())
     return JSONResponse({"success": True, "message": "Configuration updated"})
 
 
-@router.post("/start_measure")
-async def start_measure():
-    start_measurement()
-    return JSONResponse({"success": True, "message": "Measurement started"})
+@device_router.post("/start_measure")
+async def start_measure(request: Request, device: Device = Depends(get_device)):
+    body = await request.body()
+    try:
+        session = SessionRequest.model_validate_json(body) if body else SessionRequest()
+    except ValidationError as e:
+        return JSONResponse({"success": False, "message": f"Invalid request: {validation_message(e)}"})
+    session_id = await device.start_measurement(session.name)
+    return JSONResponse({"success": True, "message": "Measurement started", "session": session_id})
 
 
-@router.post("/stop_measure")
-async def stop_measure():
-    stop_measurement()
+@device_router.post("/stop_measure")
+async def stop_measure(device: Device = Depends(get_device)):
+    await device.stop_measurement()
     return JSONResponse({"success": True, "message": "Measurement stopped"})
 
 
-@router.get("/get_measurements")
-async def get_measurement_data():
-    measurements = get_measurements()
+@router.get("/sessions")
+async def get_sessions():
+    return JSONResponse(await list_sessions())
+
+
+@router.get("/sessions/{session_id}/data")
+async def get_session_series(
+    session_id: int,
+    from_: Optional[float] = Query(None, alias="from"),
+    to: Optional[float] = None,
+    points: int = Query(2000, ge=3, le=100_000),
+    method: Literal["minmax", "lttb"] = "minmax",
+    channel: Literal["z_mag", "phase_rad"] = "z_mag",
+    quantities: Optional[str] = None,
+):
+    try:
+        names = parse_quantities(quantities)
+    except ValueError as e:
+        return JSONResponse({"success": False, "message": str(e)}, status_code=400)
+    measurements = await get_session_data(session_id, from_, to, points, method, channel, names)
+    if measurements is None:
+        return JSONResponse({"success": False, "message": "Session not found"}, status_code=404)
     return JSONResponse(measurements)
 
 
-@router.get("/export_csv")
-async def export_measurements():
-    csv_file = export_to_csv()
-    if not csv_file:
+@device_router.get("/stats")
+async def measurement_stats(device: Device = Depends(get_device)):
+    """Running mean/std, min/max and Allan deviation since the measurement started"""
+    return JSONResponse(device.statistics.summary())
+
+
+@device_router.post("/stats/reset")
+async def reset_stats(device: Device = Depends(get_device)):
+    device.statistics.reset()
+    return JSONResponse({"success": True, "message": "Statistics reset"})
+
+
+@device_router.get("/acquisition_stats")
+async def acquisition_stats(device: Device = Depends(get_device)):
+    return JSONResponse(device.get_acquisition_stats())
+
+
+@router.get("/history")
+async def get_history(
+    session: Optional[int] = None,
+    from_: Optional[float] = Query(None, alias="from"),
+    to: Optional[float] = None,
+    limit: int = Query(10_000, ge=1, le=1_000_000),
+    quantities: Optional[str] = None,
+    format: str = "json",
+):
+    """Stored samples; quantities adds derived values, e.g. quantities=Ls,Q (see circuit.QUANTITIES)"""
+    try:
+        names = parse_quantities(quantities)
+    except ValueError as e:
+        return JSONResponse({"success": False, "message": str(e)}, status_code=400)
+    if format == "json":
+        return JSONResponse(await query_history(session, from_, to, limit, names))
+    if format not in EXPORT_FORMATS:
+        return JSONResponse({"success": False, "message": f"Unknown export format: {format}"})
+
+    try:
+        data = await export_history(format, session, from_, to, limit, names)
+    except ImportError:
+        return JSONResponse({"success": False, "message": f"pyarrow is required for {format} export"})
+    media_type, extension = EXPORT_FORMATS[format]
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return Response(
+        data,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="lcr_history_{timestamp}.{extension}"'},
+    )
+
+
+@device_router.get("/get_measurements")
+async def get_measurement_data(
+    request: Request,
+    since: Optional[int] = None,
+    max_: int = Query(100, alias="max", ge=1),
+    format: Optional[Literal["records", "columnar"]] = None,
+    device: Device = Depends(get_device),
+):
+    if format is None:
+        format = "columnar" if COLUMNAR_MEDIA_TYPE in request.headers.get("accept", "") else "records"
+    return Response(device.get_measurements_json(max_, since, format), media_type="application/json")
+
+
+@device_router.get("/get_raw_measurements")
+async def get_raw_measurement_data(
+    since: Optional[int] = None, max_: int = Query(100, alias="max", ge=1), device: Device = Depends(get_device)
+):
+    measurements = device.get_raw_measurements(max_, since)
+    if measurements is None:
+        return JSONResponse({"success": False, "message": "Raw frames are not being kept"})
+    return Response(dumps(measurements), media_type="application/json")
+
+
+async def _send_batches(websocket: WebSocket, queue: asyncio.Queue) -> None:
+    while True:
+        first = await queue.get()
+        await asyncio.sleep(STREAM_BATCH_INTERVAL)
+        await websocket.send_text(dumps(drain(queue, first, STREAM_BATCH_SIZE)).decode("utf-8"))
+
+
+@device_router.websocket("/ws/measurements")
+async def stream_measurements(websocket: WebSocket, device: Device = Depends(get_device)):
+    await websocket.accept()
+    queue = device.measurement_stream.subscribe()
+    sender = asyncio.create_task(_send_batches(websocket, queue))
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        device.measurement_stream.unsubscribe(queue)
+
+
+@device_router.post("/sweep")
+async def start_sweep(config: SweepConfig, device: Device = Depends(get_device)):
+    if not device.meter.is_connected:
+        return JSONResponse({"success": False, "message": "Not connected"})
+
+    frequencies = sweep_frequencies(config.start, config.stop, config.points, config.scale)
+    job = SweepJob(device.meter, frequencies, config.settle, config.samples_per_point, config.average)
+    await device.start_sweep(job)
+    return JSONResponse({"success": True, "message": "Sweep started", "sweep": job.info()})
+
+
+@device_router.get("/sweep")
+async def get_sweep(device: Device = Depends(get_device)):
+    if device.sweep is None:
+        return JSONResponse({"success": False, "message": "No sweep"})
+    return JSONResponse({**device.sweep.info(), "results": device.sweep.results})
+
+
+@device_router.post("/sweep/cancel")
+async def cancel_sweep(device: Device = Depends(get_device)):
+    await device.cancel_sweep()
+    return JSONResponse({"success": True, "message": "Sweep cancelled"})
+
+
+@device_router.websocket("/ws/sweep")
+async def stream_sweep(websocket: WebSocket, device: Device = Depends(get_device)):
+    await websocket.accept()
+    job = device.sweep
+    if job is None:
+        await websocket.close()
+        return
+
+    queue = job.stream.subscribe()
+    try:
+        # Points completed before the client connected, then live events until the end
+        await websocket.send_text(json.dumps({"type": "snapshot", **job.info(), "results": job.results}))
+        if job.finished_at is None:
+            while True:
+                event = await queue.get()
+                await websocket.send_text(json.dumps(event))
+                if event["type"] == "end":
+                    break
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        job.stream.unsubscribe(queue)
+
+
+@device_router.post("/sort")
+async def start_sorting(config: SortConfig, device: Device = Depends(get_device)):
+    if config.nominal == 0:
+        return JSONResponse({"success": False, "message": "Nominal value must not be zero"})
+    sorter = Sorter(config.nominal, config.bins, config.mode, config.frequency)
+    await device.start_sorting(sorter)
+    return JSONResponse({"success": True, "message": "Sorting started", "sorting": sorter.info()})
+
+
+@device_router.get("/sort")
+async def get_sorting(device: Device = Depends(get_device)):
+    if device.sorter is None:
+        return JSONResponse({"success": False, "message": "Sorting is off"})
+    return JSONResponse(device.sorter.info())
+
+
+@device_router.post("/sort/reset")
+async def reset_sorting(device: Device = Depends(get_device)):
+    if device.sorter is not None:
+        device.sorter.reset()
+    return JSONResponse({"success": True, "message": "Counters reset"})
+
+
+@device_router.post("/sort/stop")
+async def stop_sorting(device: Device = Depends(get_device)):
+    device.stop_sorting()
+    return JSONResponse({"success": True, "message": "Sorting stopped"})
+
+
+@device_router.websocket("/ws/sort")
+async def stream_sort_results(websocket: WebSocket, device: Device = Depends(get_device)):
+    """One message per sorted sample, sent as soon as it is evaluated"""
+    await websocket.accept()
+    sorter = device.sorter
+    if sorter is None:
+        await websocket.close()
+        return
+
+    queue = sorter.results.subscribe()
+
+    async def send_results():
+        while True:
+            await websocket.send_text(dumps(await queue.get()).decode("utf-8"))
+
+    sender = asyncio.create_task(send_results())
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        sorter.results.unsubscribe(queue)
+
+
+@device_router.get("/export_csv")
+async def export_measurements(quantities: Optional[str] = None, device: Device = Depends(get_device)):
+    try:
+        names = parse_quantities(quantities)
+    except ValueError as e:
+        return JSONResponse({"success": False, "message": str(e)}, status_code=400)
+    csv_chunks = device.export_to_csv(quantities=names)
+    if not csv_chunks:
         return JSONResponse({"success": False, "message": "No data to export"})
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    return FileResponse(csv_file, media_type="text/csv", filename=f"lcr_measurements_{timestamp}.csv")
+    return StreamingResponse(
+        csv_chunks,
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="lcr_measurements_{device.id}_{timestamp}.csv"'},
+    )
+
+
+@device_router.get("/export")
+async def export_data(format: str = "csv", quantities: Optional[str] = None, device: Device = Depends(get_device)):
+    if format == "csv":
+        return await export_measurements(quantities, device)
+    if format not in EXPORT_FORMATS:
+        return JSONResponse({"success": False, "message": f"Unknown export format: {format}"})
+    try:
+        names = parse_quantities(quantities)
+    except ValueError as e:
+        return JSONResponse({"success": False, "message": str(e)}, status_code=400)
+
+    try:
+        data = await asyncio.to_thread(device.export_columns, format, names)
+    except ImportError:
+        return JSONResponse({"success": False, "message": f"pyarrow is required for {format} export"})
+    if not data:
+        return JSONResponse({"success": False, "message": "No data to export"})
+
+    media_type, extension = EXPORT_FORMATS[format]
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return Response(
+        data,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="lcr_measurements_{device.id}_{timestamp}.{extension}"'},
+    )
+
+
+router.include_router(device_router)
+router.include_router(device_router, prefix="/devices/{device_id}")
@@ -28,13 +28,35 @@
 #     from app.services.meter import get_available_ports
 #     ports = get_available_ports()
 #     return templates.TemplateResponse("index.html", {"request": request, "ports": ports})
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 import os
 
-app = FastAPI()
+from app.services.devices import devices, start_worker, stop_worker
+from app.services.ports import port_inventory
+from app.services.measurement import measurement_store
+from app.services import metrics
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the acquisition engine for the lifetime of the app"""
+    await port_inventory.start()
+    await start_worker()
+    yield
+    await stop_worker()
+    await port_inventory.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+app.add_middleware(metrics.RequestLatencyMiddleware)
+
 
 # Configure paths
 base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -56,8 +78,12 @@ app.include_router(api_router, prefix="/api")
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     """Serve the main interface page"""
-    # Get available ports for the dropdown
-    from app.services.meter import get_available_ports
-
-    ports = get_available_ports()
+    # Ports for the dropdown, from the background-refreshed inventory
+    ports = port_inventory.devices
     return templates.TemplateResponse("index.html", {"request": request, "ports": ports})
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus/OpenMetrics scrape endpoint"""
+    return Response(metrics.render(devices.list(), measurement_store), media_type=metrics.CONTENT_TYPE_LATEST)
@@ -1,15 +1,46 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field, PositiveInt
+from typing import Literal, Optional, List, Union
+
+# Highest frequency command 67 can carry, as Hz * 100 in 32 bits
+MAX_FREQUENCY = (2**32 - 1) / 100
 
 
 class MeasurementConfig(BaseModel):
-    frequency: int = 1000
+    frequency: float = Field(1000, gt=0, le=MAX_FREQUENCY)
     mode: str = "Z"
     speed: str = "normal"
     range: str = "auto"
+    rate: float = Field(10.0, ge=0)  # Target samples per second, 0 = as fast as possible
+    pipeline: int = Field(1, ge=1, le=1024)  # Measurement requests kept in flight at rate 0
+    processing: Literal["none", "boxcar", "median"] = "none"
+    decimate: int = Field(1, ge=1)  # Frames reduced into each stored sample
+    reject_flags: int = Field(0, ge=0, le=255)  # Drop frames with any of these flag bits set
+    raw_capacity: int = Field(100_000, ge=0, le=10_000_000)  # Raw frames kept while processing is active
+
+
+class SessionRequest(BaseModel):
+    name: Optional[str] = None  # Label of the recorded session
+
+
+class SweepConfig(BaseModel):
+    start: float = Field(20.0, gt=0, le=MAX_FREQUENCY)  # Hz
+    stop: float = Field(1_000_000.0, gt=0, le=MAX_FREQUENCY)  # Hz
+    points: int = Field(100, ge=1, le=10_000)
+    scale: Literal["linear", "log"] = "log"
+    settle: float = Field(0.0, ge=0.0, le=60.0)  # Seconds to wait after changing frequency
+    samples_per_point: int = Field(1, ge=1, le=1000)
+    average: Literal["mean", "median"] = "mean"
+
+
+class SortConfig(BaseModel):
+    nominal: float  # In the unit of the mode: H, F, Ω or S
+    bins: List[float] = Field([1.0, 5.0, 10.0], min_length=1)  # Tolerances in percent
+    mode: Literal["L", "C", "R", "Z", "Y", "Q", "D"] = "C"  # Sorted quantity: Ls, Cs, Rs, |Z|, |Y|, Q or D
+    frequency: Optional[float] = Field(None, gt=0, le=MAX_FREQUENCY)  # Hz, None keeps the current frequency
 
 
 class MeasurementData(BaseModel):
+    seq: int
     timestamp: str
     mode: str
     frequency: float
@@ -24,7 +55,9 @@ class MeasurementData(BaseModel):
 
 
 class ConnectionRequest(BaseModel):
-    port: str
+    port: str = ""
+    baudrate: Union[PositiveInt, Literal["auto"]] = "auto"  # "auto" runs autotune after connecting
+    id: Optional[str] = None  # Device id when adding a device, derived from the port if not given
 
 
 class DeviceInfo(BaseModel):
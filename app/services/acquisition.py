@@ -0,0 +1,197 @@
+import asyncio
+import math
+import time
+from typing import Callable, Dict, Any, Optional
+
+import numpy as np
+
+from app.services.meter import Meter
+
+# Measurements requested per pipelined serial transaction
+PIPELINE_BATCH = 64
+
+
+class AcquisitionEngine:
+    """Background acquisition loop with monotonic-clock deadline scheduling.
+
+    Sample k is due at start + k / target_rate, so the command round-trip time
+    does not add up into rate drift. When a read overruns its slot the engine
+    counts a missed deadline and skips to the next future slot instead of
+    bursting to catch up. A target rate of 0 reads as fast as the meter answers.
+
+    At rate 0 with pipeline_depth > 1, frames are requested in batches with
+    pipeline_depth requests in flight and handed to on_batch as columns.
+    """
+
+    def __init__(
+        self,
+        meter: Meter,
+        on_sample: Callable[[Dict[str, Any]], None],
+        target_rate: float = 10.0,
+        on_batch: Optional[Callable[[Dict[str, np.ndarray]], None]] = None,
+        pipeline_depth: int = 1,
+    ):
+        self.meter = meter
+        self.on_sample = on_sample
+        self.on_batch = on_batch
+        self.target_rate = target_rate
+        self.pipeline_depth = pipeline_depth
+        self._task: Optional[asyncio.Task] = None
+        self._active: Optional[asyncio.Event] = None
+        self._wakeup: Optional[asyncio.Event] = None  # Cuts the wait for the next slot short
+        self._measuring = False
+        self._reset_stats()
+
+    def _reset_stats(self) -> None:
+        self.samples = 0
+        self.errors = 0
+        self.missed_deadlines = 0
+        self.achieved_rate = 0.0
+        self._window_start = time.monotonic()
+        self._window_samples = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def is_measuring(self) -> bool:
+        return self._measuring
+
+    def start(self) -> None:
+        """Start the background task (called from the app lifespan)"""
+        if not self.is_running:
+            self._active = asyncio.Event()
+            self._wakeup = asyncio.Event()
+            if self._measuring:
+                self._active.set()
+            self._task = asyncio.create_task(self.measurement_worker(), name="measurement_worker")
+
+    async def stop(self) -> None:
+        """Cancel the background task and wait for it to finish"""
+        self._measuring = False
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def resume(self) -> None:
+        """Begin taking measurements"""
+        self._reset_stats()
+        self._measuring = True
+        if self._active is not None:
+            self._active.set()
+        self._wake()
+
+    def pause(self) -> None:
+        """Stop taking measurements, keeping the task alive"""
+        self._measuring = False
+        if self._active is not None:
+            self._active.clear()
+        self._wake()
+
+    def set_target_rate(self, rate: float) -> None:
+        rate = max(float(rate), 0.0)
+        if rate != self.target_rate:
+            self.target_rate = rate
+            self._wake()
+
+    def _wake(self) -> None:
+        """Make the worker act on a new rate or state now rather than at the next slot"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def set_pipeline_depth(self, depth: int) -> None:
+        self.pipeline_depth = max(int(depth), 1)
+
+    def stats(self) -> Dict[str, Any]:
+        """Report achieved rate and scheduling statistics"""
+        return {
+            "running": self.is_running,
+            "measuring": self.is_measuring,
+            "target_rate": self.target_rate,
+            "achieved_rate": self.achieved_rate,
+            "samples": self.samples,
+            "errors": self.errors,
+            "missed_deadlines": self.missed_deadlines,
+            "pipeline_depth": self.pipeline_depth,
+            "link": self.meter.transport.counters(),
+        }
+
+    def _count_sample(self, now: float, n: int = 1) -> None:
+        self.samples += n
+        self._window_samples += n
+        elapsed = now - self._window_start
+        if elapsed >= 1.0:
+            self.achieved_rate = self._window_samples / elapsed
+            self._window_start = now
+            self._window_samples = 0
+
+    async def measurement_worker(self) -> None:
+        """Background worker for continuous measurements"""
+        while True:
+            await self._active.wait()
+            if not self.meter.is_connected:
+                if self.meter.transport.lost:
+                    # The port failed mid-run: reopen it, backing off between attempts
+                    await self.meter.transport.reconnect()
+                else:
+                    await asyncio.sleep(0.5)
+                continue
+
+            self._wakeup.clear()
+            period = 1.0 / self.target_rate if self.target_rate > 0 else 0.0
+            start = time.monotonic()
+            slot = 0
+            while self._active.is_set() and self.meter.is_connected:
+                if self.target_rate == 0 and self.pipeline_depth > 1 and self.on_batch is not None:
+                    await self._read_batch()
+                    await asyncio.sleep(0)
+                    continue
+
+                measurement = await self.meter.read_measurement()
+                now = time.monotonic()
+                if measurement:
+                    self.on_sample(measurement)
+                    self._count_sample(now)
+                else:
+                    self.errors += 1
+
+                new_period = 1.0 / self.target_rate if self.target_rate > 0 else 0.0
+                if new_period != period:
+                    # Rate changed: restart the schedule from here
+                    period, start, slot = new_period, now, 0
+                if period == 0.0:
+                    await asyncio.sleep(0)
+                    continue
+
+                slot += 1
+                deadline = start + slot * period
+                if now > deadline:
+                    self.missed_deadlines += 1
+                    slot = math.ceil((now - start) / period)
+                    deadline = start + slot * period
+                await self._wait_until(deadline)
+
+    async def _wait_until(self, deadline: float) -> None:
+        """Sleep until deadline (monotonic), or until woken by a change of rate or state"""
+        if not self._wakeup.is_set():
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                pass
+        self._wakeup.clear()
+
+    async def _read_batch(self) -> None:
+        started = time.time()
+        columns = await self.meter.read_measurements(PIPELINE_BATCH, self.pipeline_depth)
+        n = len(columns["mode"]) if columns else 0
+        self.errors += PIPELINE_BATCH - n
+        if n:
+            # Spread the batch's timestamps evenly over the transaction
+            columns["timestamp"] = np.linspace(started, time.time(), n + 1)[1:]
+            self.on_batch(columns)
+            self._count_sample(time.monotonic(), n)
@@ -0,0 +1,171 @@
+import math
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+
+from app.services.circuit import equivalent_circuit
+from app.services.decoder import MODE_NAMES, MODE_CODES, MODE_UNITS, SPEED_NAMES, SPEED_CODES, derive_values
+
+# Column layout of the ring buffer: 28 bytes per sample. Frequency is float64
+# because float32 only resolves 0.0625 Hz at 1 MHz, short of the 0.01 Hz steps
+FIELDS = [
+    ("timestamp", np.float64),
+    ("frequency", np.float64),
+    ("z_mag", np.float32),
+    ("phase_rad", np.float32),
+    ("mode", np.uint8),
+    ("speed", np.uint8),
+    ("range", np.uint8),
+    ("flags", np.uint8),
+]
+
+
+class MeasurementBuffer:
+    """Fixed-capacity, column-oriented ring buffer of measurements.
+
+    Samples are numbered by an ever-increasing sequence number; sample ``seq``
+    lives at position ``seq % capacity``. Once the buffer is full the oldest
+    samples are overwritten. Windows that do not cross the wrap point are
+    returned as views into the columns without copying.
+    """
+
+    def __init__(self, capacity: int = 1_000_000):
+        self.capacity = capacity
+        self.columns: Dict[str, np.ndarray] = {name: np.zeros(capacity, dtype=dtype) for name, dtype in FIELDS}
+        self.count = 0  # Total number of samples ever appended, i.e. the next sequence number
+        self.cleared = 0  # Sequence number of the first sample after the last clear
+
+    def __len__(self) -> int:
+        return min(self.count - self.cleared, self.capacity)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self.columns.values())
+
+    @property
+    def first_seq(self) -> int:
+        """Sequence number of the oldest sample still held"""
+        return self.count - len(self)
+
+    def clear(self) -> None:
+        """Drop all samples; sequence numbers keep increasing"""
+        self.cleared = self.count
+
+    def append(self, measurement: Dict[str, Any], timestamp: Optional[float] = None) -> int:
+        """Append one measurement dict, returning its sequence number"""
+        seq = self.count
+        i = seq % self.capacity
+        columns = self.columns
+        columns["timestamp"][i] = time.time() if timestamp is None else timestamp
+        columns["frequency"][i] = measurement["frequency"]
+        columns["z_mag"][i] = measurement["z_mag"]
+        columns["phase_rad"][i] = measurement["phase_rad"]
+        columns["mode"][i] = MODE_CODES.get(measurement["mode"], 255)
+        columns["speed"][i] = SPEED_CODES.get(measurement["speed"], 255)
+        columns["range"][i] = measurement["range"]
+        columns["flags"][i] = measurement["flags"]
+        self.count = seq + 1
+        return seq
+
+    def extend(self, columns: Dict[str, np.ndarray]) -> int:
+        """Append a block of samples given as columns, returning the first sequence number.
+
+        columns must hold every buffer field, e.g. decoded frames plus a
+        timestamp column. Codes are stored as decoded, without name lookups.
+        """
+        n = len(columns["timestamp"])
+        first = self.count
+        # A block longer than the buffer only leaves its tail behind
+        skip = max(n - self.capacity, 0)
+        i = (first + skip) % self.capacity
+        head = min(n - skip, self.capacity - i)
+        for name, column in self.columns.items():
+            values = columns[name][skip:]
+            column[i : i + head] = values[:head]
+            column[: len(values) - head] = values[head:]
+        self.count = first + n
+        return first
+
+    def window(self, start: int, stop: int) -> Dict[str, np.ndarray]:
+        """Columns for sequence numbers [start, stop), clipped to what is held"""
+        start = max(start, self.first_seq)
+        stop = max(min(stop, self.count), start)
+
+        i, j = start % self.capacity, stop % self.capacity
+        if stop == start:
+            window = {name: column[:0] for name, column in self.columns.items()}
+        elif i < j or j == 0:
+            end = j or self.capacity
+            window = {name: column[i:end] for name, column in self.columns.items()}
+        else:
+            # Window crosses the wrap point
+            window = {name: np.concatenate((column[i:], column[:j])) for name, column in self.columns.items()}
+        window["seq"] = np.arange(start, stop, dtype=np.int64)
+        return window
+
+    def last(self, n: int) -> Dict[str, np.ndarray]:
+        """Columns for the most recent n samples"""
+        return self.window(self.count - n, self.count)
+
+    def since(self, seq: int, n: int) -> Dict[str, np.ndarray]:
+        """Columns for up to n samples following sequence number seq"""
+        return self.window(seq + 1, seq + 1 + n)
+
+
+def to_records(columns: Dict[str, np.ndarray], quantities: Sequence[str] = ()) -> List[Dict[str, Any]]:
+    """Convert buffer columns to the measurement dicts served by the API.
+
+    Each derived quantity named in quantities (see circuit.QUANTITIES) is
+    added to every record, null where undefined.
+    """
+    phase_deg = np.degrees(columns["phase_rad"].astype(np.float64))
+    values = derive_values(columns["mode"], columns["frequency"], columns["z_mag"], phase_deg)
+    records = []
+    seconds: Dict[int, str] = {}  # Formatted date and time, per whole second
+    for seq, t, freq, z_mag, phase_rad, phase_deg, mode, speed, range_, flags, value in zip(
+        columns["seq"].tolist(),
+        columns["timestamp"].tolist(),
+        columns["frequency"].tolist(),
+        columns["z_mag"].tolist(),
+        columns["phase_rad"].tolist(),
+        phase_deg.tolist(),
+        columns["mode"].tolist(),
+        columns["speed"].tolist(),
+        columns["range"].tolist(),
+        columns["flags"].tolist(),
+        values.tolist(),
+    ):
+        second = math.floor(t)
+        microseconds = round((t - second) * 1e6)
+        if microseconds < 1_000_000:
+            prefix = seconds.get(second)
+            if prefix is None:
+                prefix = seconds[second] = datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S")
+            timestamp = f"{prefix}.{microseconds // 1000:03d}"
+        else:
+            timestamp = datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        measurement = {
+            "seq": seq,
+            "timestamp": timestamp,
+            "mode": MODE_NAMES.get(mode, "?"),
+            "frequency": freq,
+            "z_mag": z_mag,
+            "phase_rad": phase_rad,
+            "phase_deg": phase_deg,
+            "speed": SPEED_NAMES[speed] if speed < 3 else "?",
+            "range": range_,
+            "flags": flags,
+        }
+        if not math.isnan(value):
+            measurement["value"] = value
+            measurement["unit"] = MODE_UNITS[mode]
+        records.append(measurement)
+
+    if quantities:
+        derived = equivalent_circuit(columns["frequency"], columns["z_mag"], columns["phase_rad"], quantities)
+        for name, column in derived.items():
+            for measurement, x in zip(records, column.tolist()):
+                measurement[name] = None if x != x else x
+    return records
@@ -0,0 +1,93 @@
+import math
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Quantities derived from |Z|, θ and frequency, with their units
+QUANTITIES = {
+    "Rs": "Ω",  # Series resistance, Re(Z)
+    "Xs": "Ω",  # Series reactance, Im(Z)
+    "Ls": "H",
+    "Cs": "F",
+    "Y": "S",  # |Y|
+    "G": "S",  # Conductance, Re(Y)
+    "B": "S",  # Susceptance, Im(Y)
+    "Rp": "Ω",
+    "Lp": "H",
+    "Cp": "F",
+    "Q": "",
+    "D": "",
+}
+
+# Each quantity from ω, Rs, Xs, G and B; the operators work for floats and arrays alike
+FORMULAS = {
+    "Rs": lambda omega, rs, xs, g, b: rs,
+    "Xs": lambda omega, rs, xs, g, b: xs,
+    "Ls": lambda omega, rs, xs, g, b: xs / omega,
+    "Cs": lambda omega, rs, xs, g, b: -1 / (omega * xs),
+    "Y": lambda omega, rs, xs, g, b: (g * g + b * b) ** 0.5,  # 1/|Z|
+    "G": lambda omega, rs, xs, g, b: g,
+    "B": lambda omega, rs, xs, g, b: b,
+    "Rp": lambda omega, rs, xs, g, b: 1 / g,
+    "Lp": lambda omega, rs, xs, g, b: -1 / (omega * b),
+    "Cp": lambda omega, rs, xs, g, b: b / omega,
+    "Q": lambda omega, rs, xs, g, b: abs(xs) / rs,
+    "D": lambda omega, rs, xs, g, b: rs / abs(xs),
+}
+
+
+def parse_quantities(text: Optional[str]) -> List[str]:
+    """Comma-separated quantity names as a list, e.g. "Ls,Q" """
+    if not text:
+        return []
+    names = [name.strip() for name in text.split(",") if name.strip()]
+    unknown = [name for name in names if name not in QUANTITIES]
+    if unknown:
+        raise ValueError(f"Unknown quantities: {', '.join(unknown)} (known: {', '.join(QUANTITIES)})")
+    return names
+
+
+def equivalent_circuit(
+    frequency: np.ndarray, z_mag: np.ndarray, phase_rad: np.ndarray, quantities: Optional[Iterable[str]] = None
+) -> Dict[str, np.ndarray]:
+    """Series and parallel equivalents of each sample, by element.
+
+    Z = |Z|·e^(jθ) = Rs + jXs, Y = 1/Z = G + jB. The series model gives
+    Ls = Xs/ω and Cs = -1/(ωXs), the parallel one Rp = 1/G, Lp = -1/(ωB)
+    and Cp = B/ω. Q = |Xs|/Rs and D = 1/Q. Computed in float64 whatever the
+    input dtypes, for all QUANTITIES or just the ones given; results that
+    are undefined (e.g. Cs of a pure resistance) are NaN.
+    """
+    quantities = list(QUANTITIES) if quantities is None else list(quantities)
+    omega = 2 * np.pi * np.asarray(frequency, dtype=np.float64)
+    z_mag = np.asarray(z_mag, dtype=np.float64)
+    phase_rad = np.asarray(phase_rad, dtype=np.float64)
+    cos, sin = np.cos(phase_rad), np.sin(phase_rad)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs, xs = z_mag * cos, z_mag * sin
+        y = 1 / z_mag
+        g, b = y * cos, -y * sin
+        derived = {name: np.asarray(FORMULAS[name](omega, rs, xs, g, b), dtype=np.float64) for name in quantities}
+    for values in derived.values():
+        values[~np.isfinite(values)] = np.nan
+    return derived
+
+
+def add_quantities(columns: Dict[str, np.ndarray], quantities: List[str]) -> Dict[str, np.ndarray]:
+    """Buffer-style columns with the given derived quantities added as columns"""
+    if not quantities:
+        return columns
+    derived = equivalent_circuit(columns["frequency"], columns["z_mag"], columns["phase_rad"], quantities)
+    return {**columns, **derived}
+
+
+def quantity_value(name: str, frequency: float, z_mag: float, phase_rad: float) -> float:
+    """One quantity of a single sample, as equivalent_circuit computes it, without NumPy overhead"""
+    try:
+        cos, sin = math.cos(phase_rad), math.sin(phase_rad)
+        y = 1 / z_mag if z_mag else math.inf
+        value = FORMULAS[name](2 * math.pi * frequency, z_mag * cos, z_mag * sin, y * cos, -y * sin)
+    except (ZeroDivisionError, OverflowError, ValueError):
+        return math.nan
+    return value if math.isfinite(value) else math.nan
@@ -0,0 +1,117 @@
+import math
+import struct
+from typing import Dict, Tuple
+
+import numpy as np
+
+from app.services.circuit import equivalent_circuit, quantity_value
+
+MODE_NAMES = {0: "L", 1: "C", 2: "R", 3: "Z", 4: "Y", 5: "Q", 6: "D", 7: "θ"}
+MODE_CODES = {name: code for code, name in MODE_NAMES.items()}
+# Equivalent-circuit quantity shown as the value of each mode (|Z| and θ are measured directly)
+MODE_QUANTITIES = {0: "Ls", 1: "Cs", 2: "Rs", 4: "Y", 5: "Q", 6: "D"}
+MODE_UNITS = {0: "H", 1: "F", 2: "Ω", 3: "Ω", 4: "S", 5: "", 6: "", 7: "°"}
+SPEED_NAMES = ["fast", "normal", "average"]
+SPEED_CODES = {name: code for code, name in enumerate(SPEED_NAMES)}
+
+# Reply to command 72: 0xAA 0x48 header followed by the measurement record
+FRAME_DTYPE = np.dtype(
+    [
+        ("start", "u1"),
+        ("command", "u1"),
+        ("flags", "u1"),
+        ("mode", "u1"),
+        ("speed", "u1"),
+        ("range", "u1"),
+        ("uout1", ">u2"),
+        ("ucub", ">u2"),
+        ("frequency", ">u4"),  # Hz * 100
+        ("z_mag", ">f4"),
+        ("phase_rad", ">f4"),  # Radians
+    ]
+)
+FRAME_SIZE = FRAME_DTYPE.itemsize
+# The same layout for unpacking one frame at a time
+FRAME_STRUCT = struct.Struct(">BBBBBBHHIff")
+FRAME_HEADER = bytes([0xAA, 72])
+
+
+def derive_values(mode: np.ndarray, frequency: np.ndarray, z_mag: np.ndarray, phase_deg: np.ndarray) -> np.ndarray:
+    """Value shown for each mode (see MODE_QUANTITIES); NaN where undefined"""
+    codes = np.unique(mode).tolist()
+    needed = [MODE_QUANTITIES[code] for code in codes if code in MODE_QUANTITIES]
+    derived = equivalent_circuit(frequency, z_mag, np.radians(phase_deg), needed)
+    value = np.full(len(mode), np.nan)
+    for code in codes:
+        if code in MODE_QUANTITIES:
+            np.copyto(value, derived[MODE_QUANTITIES[code]], where=mode == code)
+    np.copyto(value, z_mag, where=mode == 3)
+    np.copyto(value, phase_deg, where=mode == 7)
+    value[~np.isfinite(value)] = np.nan
+    return value
+
+
+def derive_value(mode: int, frequency: float, z_mag: float, phase_rad: float) -> float:
+    """derive_values for a single sample"""
+    if mode in MODE_QUANTITIES:
+        return quantity_value(MODE_QUANTITIES[mode], frequency, z_mag, phase_rad)
+    elif mode == 3:
+        return z_mag if math.isfinite(z_mag) else math.nan
+    elif mode == 7:
+        return math.degrees(phase_rad) if math.isfinite(phase_rad) else math.nan
+    return math.nan
+
+
+def decode_frames(data: bytes) -> Dict[str, np.ndarray]:
+    """Decode a contiguous buffer of measurement frames into columns.
+
+    Trailing bytes that do not make up a whole frame are ignored, as are
+    frames without the 0xAA 0x48 header.
+    """
+    frames = np.frombuffer(data, dtype=FRAME_DTYPE, count=len(data) // FRAME_SIZE)
+    frames = frames[(frames["start"] == FRAME_HEADER[0]) & (frames["command"] == FRAME_HEADER[1])]
+
+    frequency = frames["frequency"] / 100.0
+    z_mag = frames["z_mag"].astype(np.float32)
+    phase_rad = frames["phase_rad"].astype(np.float32)
+    phase_deg = np.degrees(phase_rad.astype(np.float64))
+    return {
+        "flags": frames["flags"],
+        "mode": frames["mode"],
+        "speed": frames["speed"],
+        "range": frames["range"],
+        "frequency": frequency,
+        "z_mag": z_mag,
+        "phase_rad": phase_rad,
+        "phase_deg": phase_deg,
+        "value": derive_values(frames["mode"], frequency, z_mag, phase_deg),
+    }
+
+
+def align_frames(data: bytes) -> Tuple[bytes, int]:
+    """Pick whole frames out of a reply stream that may contain garbage.
+
+    Frames are located by their 0xAA 0x48 header. A header only counts as
+    the start of a frame if the next header follows exactly FRAME_SIZE bytes
+    later, or the data ends there: a frame that lost a byte would otherwise
+    take the first byte of the next one. Bytes between frames, such as the
+    remains of a frame that lost a byte, are skipped. Returns the frames
+    concatenated and the number of bytes skipped.
+    """
+    view = np.frombuffer(data, dtype=np.uint8)
+    headers = np.flatnonzero((view[:-1] == FRAME_HEADER[0]) & (view[1:] == FRAME_HEADER[1]))
+    starts = headers[headers <= len(view) - FRAME_SIZE]
+    if len(view) == FRAME_SIZE * len(starts) and np.array_equal(starts, np.arange(0, len(view), FRAME_SIZE)):
+        # Common case: nothing but aligned frames
+        return data, 0
+
+    ends = starts + FRAME_SIZE
+    starts = starts[(ends == len(view)) | np.isin(ends, headers)]
+
+    frames = []
+    end = 0
+    for start in starts.tolist():
+        if start >= end:
+            frames.append(data[start : start + FRAME_SIZE])
+            end = start + FRAME_SIZE
+    return b"".join(frames), len(view) - FRAME_SIZE * len(frames)
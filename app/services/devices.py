@@ -0,0 +1,91 @@
+import asyncio
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.measurement import Device, measurement_store
+from app.services.meter import Meter
+
+# Id of the device behind the top-level /api routes
+DEFAULT_DEVICE = "default"
+
+
+class DeviceRegistry:
+    """Meters driven by this server, keyed by device id.
+
+    Every device has its own serial transport (with its own I/O thread) and
+    acquisition task, so all meters are polled concurrently.
+    """
+
+    def __init__(self):
+        self.devices: Dict[str, Device] = {DEFAULT_DEVICE: Device(DEFAULT_DEVICE, Meter())}
+        self.running = False
+
+    @property
+    def default(self) -> Device:
+        return self.devices[DEFAULT_DEVICE]
+
+    def get(self, device_id: str) -> Optional[Device]:
+        return self.devices.get(device_id)
+
+    def list(self) -> List[Device]:
+        return list(self.devices.values())
+
+    async def add(self, port: str, device_id: Optional[str] = None, baudrate: Any = "auto") -> Tuple[bool, str]:
+        """Connect a new meter and start polling it; baudrate "auto" runs autotune"""
+        device_id = device_id or re.sub(r"[^A-Za-z0-9_.-]", "_", os.path.basename(port.rstrip("/")) or port)
+        if device_id in self.devices:
+            return False, f"Device {device_id} already exists"
+
+        device = Device(device_id)
+        success, message = await device.meter.connect(port, 9600 if baudrate == "auto" else int(baudrate))
+        if not success:
+            return False, message
+        if baudrate == "auto":
+            await device.autotune()
+        self.devices[device_id] = device
+        if self.running:
+            device.engine.start()
+        return True, device_id
+
+    async def remove(self, device_id: str) -> Tuple[bool, str]:
+        """Stop and disconnect a device"""
+        if device_id == DEFAULT_DEVICE:
+            return False, "The default device cannot be removed"
+        device = self.devices.pop(device_id, None)
+        if device is None:
+            return False, f"Unknown device {device_id}"
+        await self._shutdown(device)
+        return True, f"Removed {device_id}"
+
+    async def start(self) -> None:
+        """Open the measurement store and start every acquisition task"""
+        await measurement_store.open()
+        for device in self.devices.values():
+            device.engine.start()
+        self.running = True
+
+    async def stop(self) -> None:
+        """Stop every acquisition task, disconnect and flush the store"""
+        self.running = False
+        await asyncio.gather(*(self._shutdown(device) for device in self.devices.values()))
+        await measurement_store.close()
+
+    async def _shutdown(self, device: Device) -> None:
+        await device.cancel_sweep()
+        await device.stop_measurement()
+        await device.engine.stop()
+        await device.meter.disconnect()
+
+
+devices = DeviceRegistry()
+
+
+async def start_worker() -> None:
+    """Open the measurement store and start the acquisition tasks"""
+    await devices.start()
+
+
+async def stop_worker() -> None:
+    """Stop the acquisition tasks and flush the measurement store"""
+    await devices.stop()
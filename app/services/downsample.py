@@ -0,0 +1,28 @@
+import numpy as np
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """Indices of n points chosen by Largest-Triangle-Three-Buckets.
+
+    Keeps the first and last points and, from each of the n - 2 buckets in
+    between, the point forming the largest triangle with the previously kept
+    point and the average of the next bucket.
+    """
+    size = len(x)
+    if n >= size or n < 3:
+        return np.arange(size)
+
+    edges = np.linspace(1, size - 1, n - 1).astype(np.int64)
+    indices = np.empty(n, dtype=np.int64)
+    indices[0], indices[-1] = 0, size - 1
+
+    a = 0
+    for i in range(n - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_stop = edges[i + 2] if i + 2 < len(edges) else size
+        avg_x = x[stop:next_stop].mean()
+        avg_y = y[stop:next_stop].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
@@ -0,0 +1,65 @@
+import io
+import json
+from typing import Dict
+
+import numpy as np
+
+from app.services.decoder import MODE_NAMES, SPEED_NAMES
+
+# Binary export formats: media type and file extension
+EXPORT_FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.file", "arrow"),
+    "npz": ("application/octet-stream", "npz"),
+}
+
+# Stored with the data so that mode/speed codes can be decoded downstream
+CODE_TABLES = {"mode": MODE_NAMES, "speed": dict(enumerate(SPEED_NAMES))}
+
+
+def to_npz(columns: Dict[str, np.ndarray]) -> bytes:
+    """Columns as a compressed NumPy .npz archive"""
+    output = io.BytesIO()
+    np.savez_compressed(output, **columns)
+    return output.getvalue()
+
+
+def to_table(columns: Dict[str, np.ndarray]):
+    """Columns as a pyarrow Table with the code tables in its schema metadata"""
+    import pyarrow as pa
+
+    table = pa.table(columns)
+    metadata = {name: json.dumps(codes, ensure_ascii=False) for name, codes in CODE_TABLES.items()}
+    return table.replace_schema_metadata(metadata)
+
+
+def to_arrow(columns: Dict[str, np.ndarray]) -> bytes:
+    """Columns as an Arrow IPC file"""
+    import pyarrow as pa
+
+    table = to_table(columns)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def to_parquet(columns: Dict[str, np.ndarray]) -> bytes:
+    """Columns as a zstd-compressed Parquet file"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = pa.BufferOutputStream()
+    pq.write_table(to_table(columns), sink, compression="zstd")
+    return sink.getvalue().to_pybytes()
+
+
+def encode_columns(columns: Dict[str, np.ndarray], fmt: str) -> bytes:
+    """Encode buffer columns in one of EXPORT_FORMATS"""
+    if fmt == "npz":
+        return to_npz(columns)
+    elif fmt == "arrow":
+        return to_arrow(columns)
+    elif fmt == "parquet":
+        return to_parquet(columns)
+    raise ValueError(f"Unknown export format: {fmt}")
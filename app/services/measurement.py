@@ -1,105 +1,413 @@
-from threading import Lock
+import asyncio
 from datetime import datetime
-import time
 import csv
 import io
-from typing import List, Dict, Any
+import os
+import time
+from typing import List, Dict, Any, Iterator, Optional, Sequence
 
-from app.services.meter import send_command
+import numpy as np
+
+from app.services.meter import Meter
+from app.services.decoder import MODE_CODES, SPEED_CODES
+from app.services.acquisition import AcquisitionEngine
+from app.services.buffer import MeasurementBuffer, to_records
+from app.services.circuit import QUANTITIES, add_quantities
+from app.services.stream import MeasurementStream
+from app.services.export import encode_columns
+from app.services.sweep import SweepJob
+from app.services.metrics import TimedLock
+from app.services.serialize import encode_measurements
+from app.services.statistics import StatisticsEngine
+from app.services.processing import ProcessingPipeline, measurement_columns
+from app.services.sorting import Sorter
+from app.services.storage import MeasurementStore
 from app.models.schemas import MeasurementData
 
-# Global variables for measurement data
-measurement_data: List[Dict[str, Any]] = []
-data_lock = Lock()
-is_measuring = bool = False
-current_config: Dict[str, Any] = {"frequency": 1000, "mode": "Z", "speed": "normal", "range": "auto"}
+# Number of samples kept in memory (about 28 bytes each)
+BUFFER_CAPACITY = 1_000_000
+# Rows serialized per chunk of a streamed export
+EXPORT_CHUNK_SIZE = 10_000
+# SQLite file holding the measurement history
+DB_PATH = os.environ.get("LCR_DB_PATH", "measurements.db")
+# Encoded get_measurements payloads kept per device for the current buffer state
+ENCODED_CACHE_SIZE = 64
+# Configuration a newly added device starts with
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "frequency": 1000,
+    "mode": "Z",
+    "speed": "normal",
+    "range": "auto",
+    "rate": 10.0,
+    "pipeline": 1,
+    "processing": "none",  # none, boxcar or median, applied over each decimation group
+    "decimate": 1,
+    "reject_flags": 0,  # Drop frames with any of these flag bits set
+    "raw_capacity": 100_000,  # Raw frames kept while processing is active, 0 = none
+}
+# Settings that take effect by rebuilding the processing pipeline
+PROCESSING_KEYS = ["processing", "decimate", "reject_flags", "raw_capacity"]
+
+# History of all devices
+measurement_store = MeasurementStore(DB_PATH)
+
+
+class Device:
+    """One meter with its own connection, configuration, acquisition task and data"""
+
+    def __init__(self, device_id: str, meter: Meter = None, capacity: int = BUFFER_CAPACITY):
+        self.id = device_id
+        self.meter = meter or Meter()
+        self.measurement_data = MeasurementBuffer(capacity)
+        self.data_lock = TimedLock()
+        self.measurement_stream = MeasurementStream()
+        self.statistics = StatisticsEngine()
+        self.processing = ProcessingPipeline()
+        self.raw_data: Optional[MeasurementBuffer] = None
+        self.sorter: Optional[Sorter] = None
+        self.current_session: Optional[int] = None
+        self.current_config: Dict[str, Any] = dict(DEFAULT_CONFIG)
+        self.engine = AcquisitionEngine(
+            self.meter,
+            self.record_measurement,
+            target_rate=self.current_config["rate"],
+            on_batch=self.record_batch,
+            pipeline_depth=self.current_config["pipeline"],
+        )
+        self.sweep: Optional[SweepJob] = None
+        self._encoded: Dict[tuple, bytes] = {}
+        self._encoded_version: tuple = ()
+        self._sweep_task: Optional[asyncio.Task] = None
+
+    def record_measurement(self, measurement: Dict[str, Any]) -> None:
+        """Store a measurement produced by the acquisition engine"""
+        timestamp = time.time()
+        if self.processing.active:
+            self._record_processed(measurement_columns(measurement, timestamp))
+            return
+        with self.data_lock:
+            seq = self.measurement_data.append(measurement, timestamp)
+        measurement["seq"] = seq
+        if self.sorter is not None:
+            columns = measurement_columns(measurement, timestamp)
+            columns["seq"] = np.array([seq])
+            self.sorter.evaluate(columns)
+        self.statistics.add(measurement, timestamp)
+        self.measurement_stream.publish(measurement)
+        measurement_store.add(
+            (
+                self.current_session,
+                seq,
+                timestamp,
+                measurement["frequency"],
+                measurement["z_mag"],
+                measurement["phase_rad"],
+                MODE_CODES.get(measurement["mode"], 255),
+                SPEED_CODES.get(measurement["speed"], 255),
+                measurement["range"],
+                measurement["flags"],
+            )
+        )
+
+    def record_batch(self, columns: Dict[str, np.ndarray]) -> None:
+        """Store a block of decoded frames produced by pipelined acquisition"""
+        if self.processing.active:
+            self._record_processed(columns)
+        else:
+            self._store_columns(columns)
+
+    def _record_processed(self, columns: Dict[str, np.ndarray]) -> None:
+        if self.raw_data is not None:
+            with self.data_lock:
+                self.raw_data.extend(columns)
+        processed = self.processing.process(columns)
+        if len(processed["timestamp"]):
+            self._store_columns(processed)
+
+    def _store_columns(self, columns: Dict[str, np.ndarray]) -> None:
+        with self.data_lock:
+            first = self.measurement_data.extend(columns)
+        columns["seq"] = np.arange(first, first + len(columns["timestamp"]), dtype=np.int64)
+        if self.sorter is not None:
+            self.sorter.evaluate(columns)
+        self.statistics.add_batch(columns)
+        if self.measurement_stream.subscribers:
+            for measurement in to_records(columns):
+                self.measurement_stream.publish(measurement)
+        session = self.current_session
+        for row in zip(
+            columns["seq"].tolist(),
+            columns["timestamp"].tolist(),
+            columns["frequency"].tolist(),
+            columns["z_mag"].tolist(),
+            columns["phase_rad"].tolist(),
+            columns["mode"].tolist(),
+            columns["speed"].tolist(),
+            columns["range"].tolist(),
+            columns["flags"].tolist(),
+        ):
+            measurement_store.add((session, *row))
 
+    def info(self) -> Dict[str, Any]:
+        """Describe the device for the device list"""
+        return {
+            "id": self.id,
+            "port": self.meter.transport.port,
+            "baudrate": self.meter.transport.baudrate,
+            "connected": self.meter.is_connected,
+            "session": self.current_session,
+            "config": self.current_config,
+            "acquisition": self.engine.stats(),
+            "sweep": self.sweep.info() if self.sweep else None,
+            "processing": self.processing.info(),
+            "sorting": self.sorter.info() if self.sorter else None,
+        }
 
-def get_measurements(limit: int = 100) -> List[Dict[str, Any]]:
-    """Get recent measurement data"""
-    with data_lock:
-        return measurement_data[-limit:]
+    def get_measurements(self, limit: int = 100, since: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get recent measurement data, or up to limit samples after sequence number since"""
+        with self.data_lock:
+            if since is None:
+                columns = self.measurement_data.last(limit)
+            else:
+                columns = self.measurement_data.since(since, limit)
+        return to_records(columns)
 
+    def get_measurements_json(self, limit: int = 100, since: Optional[int] = None, fmt: str = "records") -> bytes:
+        """get_measurements encoded as JSON (records or columnar).
 
-def clear_measurements() -> None:
-    """Clear measurement data"""
-    with data_lock:
-        measurement_data.clear()
+        Encoded payloads are cached until the next sample arrives, so any
+        number of clients polling the same query cost one encode.
+        """
+        key = (limit, since, fmt)
+        with self.data_lock:
+            version = (self.measurement_data.count, self.measurement_data.cleared)
+            if version != self._encoded_version or len(self._encoded) >= ENCODED_CACHE_SIZE:
+                self._encoded = {}
+                self._encoded_version = version
+            data = self._encoded.get(key)
+            if data is not None:
+                return data
+            if since is None:
+                columns = self.measurement_data.last(limit)
+            else:
+                columns = self.measurement_data.since(since, limit)
+        data = encode_measurements(columns, fmt)
+        with self.data_lock:
+            if self._encoded_version == version:  # Not if samples arrived while encoding
+                self._encoded[key] = data
+        return data
 
+    def clear_measurements(self) -> None:
+        """Clear measurement data"""
+        with self.data_lock:
+            self.measurement_data.clear()
 
-def start_measurement() -> None:
-    """Start continuous measurement"""
-    global is_measuring
-    is_measuring = True
+    async def start_measurement(self, name: Optional[str] = None) -> int:
+        """Start continuous measurement in a new session, returning its id"""
+        if self.current_session is not None:
+            await measurement_store.stop_session(self.current_session)
+        self.current_session = await measurement_store.start_session(name, self.current_config, self.id)
+        self.statistics.reset()
+        self.engine.resume()
+        return self.current_session
 
+    async def stop_measurement(self) -> None:
+        """Stop continuous measurement and close the current session"""
+        self.engine.pause()
+        if self.current_session is not None:
+            await measurement_store.stop_session(self.current_session)
+            self.current_session = None
 
-def stop_measurement() -> None:
-    """Stop continuous measurement"""
-    global is_measuring
-    is_measuring = False
+    def get_acquisition_stats(self) -> Dict[str, Any]:
+        """Get achieved rate and missed-deadline counters"""
+        return self.engine.stats()
 
+    async def update_config(self, new_config: Dict[str, Any]) -> None:
+        """Update measurement configuration"""
+        processing = [self.current_config[key] for key in PROCESSING_KEYS]
+        self.current_config.update(new_config)
+        self.engine.set_target_rate(self.current_config["rate"])
+        self.engine.set_pipeline_depth(self.current_config.get("pipeline", 1))
+        if [self.current_config[key] for key in PROCESSING_KEYS] != processing:
+            # A new pipeline drops the partial decimation group and the rejected count
+            self.configure_processing()
+        # Send frequency command to meter
+        await self.meter.send_command(67, self.current_config)  # Set frequency
 
-def update_config(new_config: Dict[str, Any]) -> None:
-    """Update measurement configuration"""
-    global current_config
-    current_config.update(new_config)
-    # Send frequency command to meter
-    send_command(67, current_config)  # Set frequency
+    def configure_processing(self) -> None:
+        """Rebuild the processing pipeline and raw ring from the current configuration"""
+        config = self.current_config
+        processing = ProcessingPipeline(config["processing"], config["decimate"], config["reject_flags"])
+        raw_capacity = int(config["raw_capacity"]) if processing.active else 0
+        with self.data_lock:
+            self.processing = processing
+            if not raw_capacity:
+                self.raw_data = None
+            elif self.raw_data is None or self.raw_data.capacity != raw_capacity:
+                self.raw_data = MeasurementBuffer(raw_capacity)
 
+    def get_raw_measurements(self, limit: int = 100, since: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """Recent frames from before processing, or None if they are not kept"""
+        with self.data_lock:
+            if self.raw_data is None:
+                return None
+            if since is None:
+                columns = self.raw_data.last(limit)
+            else:
+                columns = self.raw_data.since(since, limit)
+        return to_records(columns)
 
-def get_config() -> Dict[str, Any]:
-    """Get current configuration"""
-    return current_config
+    def get_config(self) -> Dict[str, Any]:
+        """Get current configuration"""
+        return self.current_config
 
+    async def autotune(self) -> Dict[str, Any]:
+        """Switch to the fastest reliable baud rate, pausing acquisition meanwhile"""
+        self.engine.pause()
+        try:
+            return await self.meter.autotune()
+        finally:
+            if self.current_session is not None:
+                self.engine.resume()
 
-def export_to_csv() -> io.BytesIO:
-    """Export measurement data as CSV"""
-    with data_lock:
-        if not measurement_data:
-            return None
+    async def start_sorting(self, sorter: Sorter) -> None:
+        """Sort every following sample into the sorter's tolerance bins"""
+        if sorter.frequency is not None:
+            await self.update_config({"frequency": sorter.frequency})
+        self.sorter = sorter
 
-        # Create CSV in memory
+    def stop_sorting(self) -> None:
+        self.sorter = None
+
+    async def start_sweep(self, job: SweepJob) -> None:
+        """Run a frequency sweep, pausing continuous acquisition while it runs"""
+        await self.cancel_sweep()
+        self.sweep = job
+        self._sweep_task = asyncio.create_task(self._run_sweep(job), name=f"sweep-{self.id}")
+
+    async def cancel_sweep(self) -> None:
+        """Cancel the running sweep, if any"""
+        if self._sweep_task is not None and not self._sweep_task.done():
+            self._sweep_task.cancel()
+            try:
+                await self._sweep_task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run_sweep(self, job: SweepJob) -> None:
+        self.engine.pause()
+        try:
+            await job.run()
+        finally:
+            # Return to the configured frequency and continue the session, if any
+            await self.meter.send_command(67, self.current_config)
+            if self.current_session is not None:
+                self.engine.resume()
+
+    def snapshot(self, start: int, stop: int) -> Dict[str, Any]:
+        """Copy the columns for sequence numbers [start, stop) out of the buffer"""
+        with self.data_lock:
+            return {name: column.copy() for name, column in self.measurement_data.window(start, stop).items()}
+
+    def export_to_csv(
+        self, chunk_size: int = EXPORT_CHUNK_SIZE, quantities: Sequence[str] = ()
+    ) -> Optional[Iterator[bytes]]:
+        """Export measurement data as CSV, streamed in chunks, with the given derived quantities"""
+        with self.data_lock:
+            if not self.measurement_data:
+                return None
+            # Fix the exported range now; samples appended later are not included
+            start, stop = self.measurement_data.first_seq, self.measurement_data.count
+        return self._csv_chunks(start, stop, chunk_size, quantities)
+
+    def export_columns(self, fmt: str, quantities: Sequence[str] = ()) -> Optional[bytes]:
+        """Export measurement data in a binary columnar format (parquet, arrow or npz)"""
+        with self.data_lock:
+            if not self.measurement_data:
+                return None
+            start, stop = self.measurement_data.first_seq, self.measurement_data.count
+        return encode_columns(add_quantities(self.snapshot(start, stop), quantities), fmt)
+
+    def _csv_chunks(self, start: int, stop: int, chunk_size: int, quantities: Sequence[str] = ()) -> Iterator[bytes]:
         output = io.StringIO()
         writer = csv.writer(output)
 
         # Write header
         writer.writerow(
             ["Timestamp", "Mode", "Frequency (Hz)", "Value", "Unit", "|Z| (Ω)", "Phase (°)", "Speed", "Range"]
+            + [f"{name} ({QUANTITIES[name]})" if QUANTITIES[name] else name for name in quantities]
         )
 
-        # Write data
-        for m in measurement_data:
-            writer.writerow(
-                [
-                    m["timestamp"],
-                    m["mode"],
-                    m["frequency"],
-                    m.get("value", ""),
-                    m.get("unit", ""),
-                    m["z_mag"],
-                    m["phase_deg"],
-                    m["speed"],
-                    m["range"],
-                ]
-            )
+        # Write data one chunk at a time, holding data_lock only while copying it.
+        # Samples overwritten by the ring buffer during a slow export are skipped.
+        seq = start
+        while seq < stop:
+            columns = self.snapshot(seq, min(seq + chunk_size, stop))
+            if not len(columns["seq"]):
+                break
+            for m in to_records(columns, quantities):
+                writer.writerow(
+                    [
+                        m["timestamp"],
+                        m["mode"],
+                        m["frequency"],
+                        m.get("value", ""),
+                        m.get("unit", ""),
+                        m["z_mag"],
+                        m["phase_deg"],
+                        m["speed"],
+                        m["range"],
+                    ]
+                    + ["" if m[name] is None else m[name] for name in quantities]
+                )
+            seq = int(columns["seq"][-1]) + 1
+            yield output.getvalue().encode("utf-8")
+            output.seek(0)
+            output.truncate()
 
-        # Prepare response
-        output.seek(0)
-        csv_bytes = io.BytesIO(output.getvalue().encode("utf-8"))
-        csv_bytes.seek(0)
-        return csv_bytes
+        if output.tell():
+            yield output.getvalue().encode("utf-8")
 
 
-def measurement_worker() -> None:
-    """Background worker for continuous measurements"""
-    global is_measuring, measurement_data, current_config
+async def query_history(
+    session_id: Optional[int] = None,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    limit: int = 10_000,
+    quantities: Sequence[str] = (),
+) -> List[Dict[str, Any]]:
+    """Get stored measurements from the SQLite history, with the given derived quantities"""
+    return to_records(await measurement_store.query(session_id, start, end, limit), quantities)
 
-    while True:
-        if is_measuring:
-            measurement = send_command(72)
-            if measurement:
-                with data_lock:
-                    measurement_data.append(measurement)
-            time.sleep(0.1)  # Adjust based on desired measurement rate
-        else:
-            time.sleep(0.5)
+
+async def export_history(
+    fmt: str,
+    session_id: Optional[int] = None,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    limit: int = 10_000,
+    quantities: Sequence[str] = (),
+) -> bytes:
+    """Stored measurements in a binary columnar format, derived quantities as extra columns"""
+    columns = await measurement_store.query(session_id, start, end, limit)
+    return await asyncio.to_thread(encode_columns, add_quantities(columns, quantities), fmt)
+
+
+async def list_sessions() -> List[Dict[str, Any]]:
+    """Get all recorded sessions, newest first"""
+    return await measurement_store.list_sessions()
+
+
+async def get_session_data(
+    session_id: int,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    points: int = 2000,
+    method: str = "minmax",
+    channel: str = "z_mag",
+    quantities: Sequence[str] = (),
+) -> Optional[List[Dict[str, Any]]]:
+    """Get a downsampled series for a session, or None if it does not exist"""
+    if await measurement_store.get_session(session_id) is None:
+        return None
+    return to_records(await measurement_store.downsample(session_id, start, end, points, method, channel), quantities)
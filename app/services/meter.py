@@ -1,133 +1,259 @@
-import serial
-import serial.tools.list_ports
+import asyncio
 import struct
-from threading import Lock
-from typing import Tuple, Optional, Dict, Any
-
-serial_connection = None
-serial_lock = Lock()
-
-
-def get_available_ports() -> list:
-    """Get list of available serial ports"""
-    ports = serial.tools.list_ports.comports()
-    return [port.device for port in ports]
-
-
-def connect_to_meter(port: str, baudrate: int = 9600) -> Tuple[bool, str]:
-    """Establish serial connection to LCR meter"""
-    global serial_connection
-
-    try:
-        with serial_lock:
-            if serial_connection and serial_connection.is_open:
-                serial_connection.close()
-            serial_connection = serial.Serial(
-                port=port,
-                baudrate=baudrate,
-                bytesize=serial.EIGHTBITS,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE,
-                timeout=1,
+import math
+import time
+from datetime import datetime
+from typing import Tuple, Optional, Dict, Any, List
+
+import numpy as np
+
+from app.services.transport import SerialTransport
+from app.services.metrics import COMMAND_DURATION, PARSE_DURATION
+from app.services.decoder import (
+    MODE_NAMES,
+    MODE_UNITS,
+    SPEED_NAMES,
+    FRAME_SIZE,
+    FRAME_HEADER,
+    FRAME_STRUCT,
+    align_frames,
+    decode_frames,
+    derive_value,
+)
+
+# Baud rates tried by autotune, fastest first
+SUPPORTED_BAUDRATES = [115200, 57600, 38400, 19200, 9600]
+# Measurements taken at each baud rate while autotuning
+AUTOTUNE_PROBES = 20
+# Read timeout while probing, so wrong baud rates are rejected quickly
+AUTOTUNE_TIMEOUT = 0.2
+# Highest frame error rate autotune accepts as reliable
+MAX_FRAME_ERROR_RATE = 0.01
+
+
+def encode_command(command: int, config: Dict[str, Any] = None) -> bytes:
+    """Format command according to protocol"""
+    if command == 67:  # Set frequency
+        freq_int = round(float(config["frequency"]) * 100) if config else 100000
+        return bytes([0xAA, command]) + struct.pack(">I", freq_int)
+    elif command == 72:  # Get measurement
+        return bytes([0xAA, command, 0])
+    return bytes([0xAA, command])
+
+
+def response_size(command: int) -> int:
+    """Number of bytes the meter sends back for a command"""
+    if command in [64, 65]:  # AA + cmd + 4 ascii bytes
+        return 6
+    elif command == 72:  # Measurement data
+        return 22
+    return 2  # Just AA + cmd
+
+
+class Meter:
+    """E7-28 protocol driver on top of an asyncio serial transport"""
+
+    def __init__(self, transport: SerialTransport = None):
+        self.transport = transport or SerialTransport()
+        self.skipped_bytes = 0  # Garbage dropped while realigning pipelined replies
+        self.link_stats: Dict[str, Any] = {}  # Result of the last autotune
+
+    @property
+    def is_connected(self) -> bool:
+        return self.transport.is_open
+
+    async def connect(self, port: str, baudrate: int = 9600) -> Tuple[bool, str]:
+        """Establish serial connection to LCR meter"""
+        try:
+            await self.transport.open(port, baudrate)
+            return True, f"Connected to {port}"
+        except Exception as e:
+            return False, f"Connection failed: {str(e)}"
+
+    async def disconnect(self) -> Tuple[bool, str]:
+        """Close serial connection"""
+        await self.transport.close()
+        return True, "Disconnected"
+
+    async def send_command(self, command: int, config: Dict[str, Any] = None) -> Any:
+        """Send command to LCR meter"""
+        if not self.transport.is_open:
+            return None
+
+        start = time.perf_counter()
+        try:
+            response = await self.transport.exchange(encode_command(command, config), response_size(command))
+        except Exception as e:
+            print(f"Command error: {str(e)}")
+            return None
+        COMMAND_DURATION.labels(str(command)).observe(time.perf_counter() - start)
+
+        if command in [64, 65]:  # Device name/ID
+            return response[2:].decode("ascii") if len(response) == 6 else None
+        elif command == 72:  # Measurement data
+            return parse_measurement(response) if len(response) == 22 else None
+        return True if len(response) == 2 and response[0] == 0xAA and response[1] == command else False
+
+    async def read_measurement(self) -> Optional[Dict[str, Any]]:
+        """Request and decode a single measurement"""
+        return await self.send_command(72)
+
+    async def read_measurements(self, count: int, depth: int) -> Optional[Dict[str, np.ndarray]]:
+        """Take count measurements with up to depth requests in flight, returning decoded columns.
+
+        Lost or corrupted frames are skipped, so fewer than count samples may
+        come back.
+        """
+        if not self.transport.is_open:
+            return None
+
+        start = time.perf_counter()
+        try:
+            # Command 65 (device ID) marks the end of the batch
+            data = await self.transport.pipeline(
+                encode_command(72), FRAME_SIZE, count, depth, encode_command(65), response_size(65)
             )
-        return True, f"Connected to {port}"
-    except Exception as e:
-        return False, f"Connection failed: {str(e)}"
+        except Exception as e:
+            print(f"Command error: {str(e)}")
+            return None
+        COMMAND_DURATION.labels("72_batch").observe(time.perf_counter() - start)
 
+        with PARSE_DURATION.time():
+            frames, skipped = align_frames(data)
+            columns = decode_frames(frames)
+        if skipped:
+            self.skipped_bytes += skipped
+            self.transport.resyncs += 1
+        return columns
 
-def disconnect_meter() -> Tuple[bool, str]:
-    """Close serial connection"""
-    global serial_connection
-    with serial_lock:
-        if serial_connection and serial_connection.is_open:
-            serial_connection.close()
-        serial_connection = None
-    return True, "Disconnected"
+    async def autotune(self, baudrates: List[int] = None, probes: int = AUTOTUNE_PROBES) -> Dict[str, Any]:
+        """Pick the fastest baud rate at which the meter answers reliably.
 
+        Each rate is probed with command 64 and then probes measurements,
+        recording the frame error rate and round-trip time. Rates are tried
+        fastest first and the first reliable one is kept; if none is, the
+        original rate is restored.
+        """
+        if not self.transport.is_open:
+            return {"success": False, "message": "Not connected"}
 
-def send_command(command: int, config: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
-    """Send command to LCR meter"""
-    if not serial_connection or not serial_connection.is_open:
-        return None
+        original_baudrate, original_timeout = self.transport.baudrate, self.transport.timeout
+        candidates = []
+        chosen = None
+        for baudrate in sorted(baudrates or SUPPORTED_BAUDRATES, reverse=True):
+            await self.transport.configure(baudrate, AUTOTUNE_TIMEOUT)
+            try:
+                result = await self.transport.transaction(_probe_link, probes)
+            except Exception as e:
+                print(f"Autotune error: {str(e)}")
+                result = {"frame_error_rate": 1.0, "rtt_ms": None, "rtt_p95_ms": None}
+            candidates.append({"baudrate": baudrate, **result})
+            if result["frame_error_rate"] <= MAX_FRAME_ERROR_RATE:
+                chosen = candidates[-1]
+                break
 
-    try:
-        with serial_lock:
-            # Format command according to protocol
-            if command == 67:  # Set frequency
-                freq_int = int(config["frequency"] * 100) if config else 100000
-                cmd = bytes([0xAA, command]) + struct.pack(">I", freq_int)
-            elif command == 72:  # Get measurement
-                cmd = bytes([0xAA, command, 0])
-            else:
-                cmd = bytes([0xAA, command])
-
-            serial_connection.write(cmd)
-
-            # Read response
-            if command in [64, 65]:  # Device name/ID
-                response = serial_connection.read(8)  # AA + cmd + 4 bytes
-                return response[2:].decode("ascii") if len(response) == 6 else None
-            elif command == 72:  # Measurement data
-                response = serial_connection.read(22)
-                if len(response) == 22:
-                    return parse_measurement(response)
-            else:
-                response = serial_connection.read(2)  # Just AA + cmd
-                return True if len(response) == 2 and response[0] == 0xAA and response[1] == command else False
-    except Exception as e:
-        print(f"Command error: {str(e)}")
-        return None
+        await self.transport.configure(chosen["baudrate"] if chosen else original_baudrate, original_timeout)
+        self.link_stats = {
+            "success": chosen is not None,
+            "message": f"Using {chosen['baudrate']} baud" if chosen else "No reliable baud rate found",
+            "baudrate": self.transport.baudrate,
+            "frame_error_rate": chosen["frame_error_rate"] if chosen else None,
+            "rtt_ms": chosen["rtt_ms"] if chosen else None,
+            "rtt_p95_ms": chosen["rtt_p95_ms"] if chosen else None,
+            "candidates": candidates,
+            "tuned_at": time.time(),
+        }
+        return self.link_stats
+
+    async def measure_at(
+        self, frequency: float, samples: int = 1, settle: float = 0.0
+    ) -> Optional[Dict[str, np.ndarray]]:
+        """Set the frequency, wait settle seconds and take samples measurements.
+
+        Without a settle time this is one serial transaction. With one, the
+        wait runs on the event loop between two transactions, so it neither
+        holds the port nor delays cancellation. Returns decoded columns (see
+        decode_frames), or None if the meter did not acknowledge the frequency.
+        """
+        if not self.transport.is_open:
+            return None
+
+        try:
+            if settle <= 0:
+                return await self.transport.transaction(_measure_at, frequency, samples)
+            if not await self.transport.transaction(_set_frequency, frequency):
+                return None
+            await asyncio.sleep(settle)
+            return await self.transport.transaction(_take_samples, samples)
+        except Exception as e:
+            print(f"Sweep point error: {str(e)}")
+            return None
+
+
+def _probe_link(exchange, probes: int) -> Dict[str, Any]:
+    reply = exchange(encode_command(64), response_size(64))
+    if len(reply) != 6 or reply[:2] != bytes([0xAA, 64]):
+        # No sensible reply at all: do not spend a timeout per probe
+        return {"frame_error_rate": 1.0, "rtt_ms": None, "rtt_p95_ms": None}
+
+    request = encode_command(72)
+    rtts = []
+    errors = 0
+    for _ in range(probes):
+        start = time.perf_counter()
+        frame = exchange(request, FRAME_SIZE)
+        rtt = time.perf_counter() - start
+        if len(frame) == FRAME_SIZE and frame[:2] == FRAME_HEADER:
+            rtts.append(rtt * 1000)
+        else:
+            errors += 1
+    return {
+        "frame_error_rate": errors / probes,
+        "rtt_ms": float(np.mean(rtts)) if rtts else None,
+        "rtt_p95_ms": float(np.percentile(rtts, 95)) if rtts else None,
+    }
+
+
+def _set_frequency(exchange, frequency: float) -> bool:
+    return exchange(encode_command(67, {"frequency": frequency}), response_size(67)) == bytes([0xAA, 67])
+
+
+def _take_samples(exchange, samples: int) -> Dict[str, np.ndarray]:
+    request = encode_command(72)
+    frames = [exchange(request, FRAME_SIZE) for _ in range(samples)]
+    return decode_frames(b"".join(frame for frame in frames if len(frame) == FRAME_SIZE))
+
+
+def _measure_at(exchange, frequency: float, samples: int) -> Optional[Dict[str, np.ndarray]]:
+    return _take_samples(exchange, samples) if _set_frequency(exchange, frequency) else None
 
 
 def parse_measurement(data: bytes) -> Dict[str, Any]:
-    """Parse measurement data according to protocol"""
-    if len(data) != 22:
+    """Parse a single measurement frame according to protocol"""
+    if len(data) != FRAME_SIZE:
         return None
 
-    # Unpack binary data
-    flags = data[0]
-    mode = data[1]
-    speed = data[2]
-    range_ = data[3]
-    freq = struct.unpack(">I", data[8:12])[0] / 100.0
-    z_mag = struct.unpack(">f", data[12:16])[0]
-    phase_rad = struct.unpack(">f", data[16:20])[0]
-    phase_deg = phase_rad * 57.2957795  # Convert to degrees
-
-    # Determine measurement mode
-    mode_names = {0: "L", 1: "C", 2: "R", 3: "Z", 4: "Y", 5: "Q", 6: "D", 7: "θ"}
-
-    # Create measurement dictionary
-    from datetime import datetime
-
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-    measurement = {
-        "timestamp": timestamp,
-        "mode": mode_names.get(mode, "?"),
-        "frequency": freq,
-        "z_mag": z_mag,
-        "phase_rad": phase_rad,
-        "phase_deg": phase_deg,
-        "speed": ["fast", "normal", "average"][speed] if speed < 3 else "?",
-        "range": range_,
-        "flags": flags,
-    }
+    with PARSE_DURATION.time():
+        start, command, flags, mode, speed, range_, _, _, freq, z_mag, phase_rad = FRAME_STRUCT.unpack(data)
+        if (start, command) != (FRAME_HEADER[0], FRAME_HEADER[1]):
+            return None
+        freq /= 100.0
+        measurement = {
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+            "mode": MODE_NAMES.get(mode, "?"),
+            "frequency": freq,
+            "z_mag": z_mag,
+            "phase_rad": phase_rad,
+            "phase_deg": math.degrees(phase_rad),
+            "speed": SPEED_NAMES[speed] if speed < 3 else "?",
+            "range": range_,
+            "flags": flags,
+        }
 
-    # Add derived values based on mode
-    if mode == 0:  # L
-        measurement["value"] = z_mag / (2 * 3.14159 * freq)
-        measurement["unit"] = "H"
-    elif mode == 1:  # C
-        measurement["value"] = 1 / (z_mag * 2 * 3.14159 * freq)
-        measurement["unit"] = "F"
-    elif mode == 2:  # R
-        measurement["value"] = z_mag
-        measurement["unit"] = "Ω"
-    elif mode == 3:  # Z
-        measurement["value"] = z_mag
-        measurement["unit"] = "Ω"
-    elif mode == 7:  # θ
-        measurement["value"] = phase_deg
-        measurement["unit"] = "°"
+        # Add derived values based on mode
+        value = derive_value(mode, freq, z_mag, phase_rad)
+        if not math.isnan(value):
+            measurement["value"] = value
+            measurement["unit"] = MODE_UNITS[mode]
 
     return measurement
@@ -0,0 +1,197 @@
+import time
+from threading import Lock
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from prometheus_client import CollectorRegistry, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.core import CounterMetricFamily
+
+# Buckets for serial and lock timings: 10 µs .. 2.5 s
+IO_BUCKETS = (1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+registry = CollectorRegistry()
+
+COMMAND_DURATION = Histogram(
+    "lcr_command_duration_seconds",
+    "Serial request/reply round-trip time, including waiting for the port",
+    ["command"],
+    buckets=IO_BUCKETS,
+    registry=registry,
+)
+SERIAL_LOCK_WAIT = Histogram(
+    "lcr_serial_lock_wait_seconds",
+    "Time spent waiting for serial_lock",
+    buckets=IO_BUCKETS,
+    registry=registry,
+)
+DATA_LOCK_HOLD = Histogram(
+    "lcr_data_lock_hold_seconds",
+    "Time data_lock is held",
+    buckets=IO_BUCKETS,
+    registry=registry,
+)
+PARSE_DURATION = Histogram(
+    "lcr_parse_duration_seconds",
+    "Time to decode measurement frames, per call",
+    buckets=IO_BUCKETS,
+    registry=registry,
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "lcr_http_request_duration_seconds",
+    "API request latency by route",
+    ["method", "route"],
+    registry=registry,
+)
+ACHIEVED_RATE = Gauge(
+    "lcr_acquisition_achieved_rate", "Samples per second over the last second", ["device"], registry=registry
+)
+TARGET_RATE = Gauge(
+    "lcr_acquisition_target_rate", "Configured samples per second, 0 = maximum", ["device"], registry=registry
+)
+BUFFER_SAMPLES = Gauge("lcr_buffer_samples", "Samples held in the in-memory ring buffer", ["device"], registry=registry)
+BUFFER_CAPACITY = Gauge("lcr_buffer_capacity", "Capacity of the in-memory ring buffer", ["device"], registry=registry)
+
+
+class SnapshotCounter:
+    """Counter whose totals are kept elsewhere and copied in on each scrape.
+
+    prometheus_client counters can only be incremented, but the acquisition
+    engine, transport, stream and store keep their own totals. Some restart
+    from 0 with a new measurement session or device, which rate() and
+    increase() treat as an ordinary counter reset.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], registry: CollectorRegistry):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = list(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        registry.register(self)
+
+    def set(self, labelvalues: Sequence[str], value: float) -> None:
+        self._values[tuple(labelvalues)] = value
+
+    def clear(self) -> None:
+        self._values.clear()
+
+    def collect(self) -> List[CounterMetricFamily]:
+        family = CounterMetricFamily(self.name, self.documentation, labels=self.labelnames)
+        for labelvalues, value in self._values.items():
+            family.add_metric(labelvalues, value)
+        return [family]
+
+
+SAMPLES = SnapshotCounter(
+    "lcr_acquisition_samples", "Samples taken in the current measurement session", ["device"], registry
+)
+ERRORS = SnapshotCounter(
+    "lcr_acquisition_errors", "Failed reads in the current measurement session", ["device"], registry
+)
+MISSED_DEADLINES = SnapshotCounter(
+    "lcr_acquisition_missed_deadlines", "Sample slots missed in the current measurement session", ["device"], registry
+)
+LINK_ERRORS = SnapshotCounter(
+    "lcr_link_errors", "Serial link errors since the device was added", ["device", "kind"], registry
+)
+STREAM_DROPPED = SnapshotCounter(
+    "lcr_stream_dropped", "Live samples dropped for slow subscribers", ["device"], registry
+)
+
+# Metrics labelled by device, refreshed on every scrape
+DEVICE_METRICS = [
+    ACHIEVED_RATE,
+    TARGET_RATE,
+    SAMPLES,
+    ERRORS,
+    MISSED_DEADLINES,
+    BUFFER_SAMPLES,
+    BUFFER_CAPACITY,
+    LINK_ERRORS,
+    STREAM_DROPPED,
+]
+
+STORE_WRITTEN = SnapshotCounter("lcr_store_written", "Samples written to the SQLite history", [], registry)
+STORE_DROPPED = SnapshotCounter(
+    "lcr_store_dropped", "Samples dropped because the SQLite writer fell behind", [], registry
+)
+STORE_PENDING = Gauge("lcr_store_pending", "Samples queued for the SQLite writer", registry=registry)
+
+
+class RequestLatencyMiddleware:
+    """ASGI middleware observing HTTP_REQUEST_DURATION per route template.
+
+    The request is timed until the last chunk of its response body has been
+    sent, so streamed responses are measured in full. Non-HTTP scopes such
+    as WebSockets pass straight through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        observed = False
+
+        def observe():
+            nonlocal observed
+            observed = True
+            route = scope.get("route")  # Set by the router once the request is matched
+            HTTP_REQUEST_DURATION.labels(scope["method"], route.path if route else "unmatched").observe(
+                time.perf_counter() - start
+            )
+
+        async def timed_send(message):
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                observe()
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            if not observed:
+                observe()
+
+
+class TimedLock:
+    """threading.Lock that records how long it is held"""
+
+    def __init__(self, histogram: Histogram = DATA_LOCK_HOLD):
+        self._lock = Lock()
+        self._histogram = histogram
+        self._acquired_at = 0.0
+
+    def __enter__(self):
+        self._lock.acquire()
+        self._acquired_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        held = time.perf_counter() - self._acquired_at
+        self._lock.release()
+        self._histogram.observe(held)
+
+
+def render(devices: Iterable, store) -> bytes:
+    """Refresh the device metrics from current state and encode all metrics"""
+    for metric in DEVICE_METRICS:
+        metric.clear()  # Forget removed devices
+    for device in devices:
+        stats = device.engine.stats()
+        ACHIEVED_RATE.labels(device.id).set(stats["achieved_rate"])
+        TARGET_RATE.labels(device.id).set(stats["target_rate"])
+        SAMPLES.set([device.id], stats["samples"])
+        ERRORS.set([device.id], stats["errors"])
+        MISSED_DEADLINES.set([device.id], stats["missed_deadlines"])
+        BUFFER_SAMPLES.labels(device.id).set(len(device.measurement_data))
+        BUFFER_CAPACITY.labels(device.id).set(device.measurement_data.capacity)
+        STREAM_DROPPED.set([device.id], device.measurement_stream.dropped)
+        for kind, count in stats["link"].items():
+            LINK_ERRORS.set([device.id, kind], count)
+    store_stats = store.stats()
+    STORE_WRITTEN.set([], store_stats["written"])
+    STORE_DROPPED.set([], store_stats["dropped"])
+    STORE_PENDING.set(store_stats["pending"])
+    return generate_latest(registry)
@@ -0,0 +1,99 @@
+import asyncio
+import os
+import time
+from typing import Dict, Any, List, Optional
+
+import serial.tools.list_ports
+
+# Full rescan interval, in seconds
+PORT_SCAN_INTERVAL = 30.0
+# How often /dev is checked for added or removed device nodes, in seconds
+HOTPLUG_CHECK_INTERVAL = 1.0
+# Watched for hotplug on Linux and macOS; elsewhere only the periodic rescan runs
+DEV_DIR = "/dev"
+
+
+def scan_ports() -> List[Dict[str, Any]]:
+    """Enumerate serial ports with their USB metadata (blocking)"""
+    return [
+        {
+            "device": port.device,
+            "description": port.description,
+            "hwid": port.hwid,
+            "vid": port.vid,
+            "pid": port.pid,
+            "serial_number": port.serial_number,
+            "manufacturer": port.manufacturer,
+            "product": port.product,
+            "location": port.location,
+        }
+        for port in sorted(serial.tools.list_ports.comports(), key=lambda port: port.device)
+    ]
+
+
+def dev_signature() -> Optional[int]:
+    """Changes whenever a device node is added to or removed from /dev"""
+    try:
+        return os.stat(DEV_DIR).st_mtime_ns
+    except OSError:
+        return None
+
+
+class PortInventory:
+    """Serial port list kept up to date in the background.
+
+    The port scan (sysfs/udev or the registry, depending on the OS) runs in
+    a worker thread at startup, every PORT_SCAN_INTERVAL seconds, and as soon
+    as /dev changes. Requests only ever read the cached list.
+    """
+
+    def __init__(self):
+        self.ports: List[Dict[str, Any]] = []
+        self.updated_at: Optional[float] = None
+        self.scan_time: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def devices(self) -> List[str]:
+        return [port["device"] for port in self.ports]
+
+    async def refresh(self) -> None:
+        """Rescan the ports now"""
+        start = time.perf_counter()
+        try:
+            self.ports = await asyncio.to_thread(scan_ports)
+        except Exception as e:
+            print(f"Port scan error: {str(e)}")
+            return
+        self.scan_time = time.perf_counter() - start
+        self.updated_at = time.time()
+
+    async def start(self) -> None:
+        await self.refresh()
+        self._task = asyncio.create_task(self._watch(), name="port_inventory")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _watch(self) -> None:
+        signature = dev_signature()
+        next_scan = time.monotonic() + PORT_SCAN_INTERVAL
+        while True:
+            await asyncio.sleep(HOTPLUG_CHECK_INTERVAL)
+            current = dev_signature()
+            if current != signature or time.monotonic() >= next_scan:
+                signature = current
+                next_scan = time.monotonic() + PORT_SCAN_INTERVAL
+                await self.refresh()
+
+    def info(self) -> Dict[str, Any]:
+        return {"ports": self.ports, "updated_at": self.updated_at, "scan_time": self.scan_time}
+
+
+port_inventory = PortInventory()
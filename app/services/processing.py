@@ -0,0 +1,91 @@
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+from app.services.decoder import MODE_CODES, SPEED_CODES, derive_values
+
+
+def measurement_columns(measurement: Dict[str, Any], timestamp: float) -> Dict[str, np.ndarray]:
+    """A single measurement dict as one-row columns, as produced by decode_frames"""
+    return {
+        "timestamp": np.array([timestamp]),
+        "frequency": np.array([measurement["frequency"]]),
+        "z_mag": np.array([measurement["z_mag"]], dtype=np.float32),
+        "phase_rad": np.array([measurement["phase_rad"]], dtype=np.float32),
+        "phase_deg": np.array([measurement["phase_deg"]]),
+        "value": np.array([measurement.get("value", np.nan)]),
+        "mode": np.array([MODE_CODES.get(measurement["mode"], 255)], dtype=np.uint8),
+        "speed": np.array([SPEED_CODES.get(measurement["speed"], 255)], dtype=np.uint8),
+        "range": np.array([measurement["range"]], dtype=np.uint8),
+        "flags": np.array([measurement["flags"]], dtype=np.uint8),
+    }
+
+
+class ProcessingPipeline:
+    """Vectorized reduction of raw frames before they are stored.
+
+    Frames whose flags share a bit with reject_flags are dropped as
+    outliers. The remaining frames are grouped decimate at a time, carrying
+    incomplete groups over to the next block, and every group becomes one
+    sample: its mean (boxcar), its median, or its last frame (none, i.e.
+    plain decimation). The sample gets the group's mean timestamp, the last
+    frame's frequency, mode, speed and range, and the OR of its flags.
+    """
+
+    def __init__(self, method: str = "none", decimate: int = 1, reject_flags: int = 0):
+        self.method = method
+        self.decimate = max(int(decimate), 1)
+        self.reject_flags = int(reject_flags)
+        self.rejected = 0
+        self._pending: Optional[Dict[str, np.ndarray]] = None
+
+    @property
+    def active(self) -> bool:
+        return self.decimate > 1 or self.reject_flags != 0
+
+    def process(self, columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Reduce a block of frames (with a timestamp column), returning the output samples"""
+        if self.reject_flags:
+            keep = (columns["flags"] & self.reject_flags) == 0
+            self.rejected += int(len(keep) - keep.sum())
+            columns = {name: column[keep] for name, column in columns.items()}
+        if self.decimate == 1:
+            return columns
+
+        if self._pending is not None:
+            columns = {name: np.concatenate((self._pending[name], column)) for name, column in columns.items()}
+        n = len(columns["timestamp"]) // self.decimate * self.decimate
+        self._pending = {name: column[n:] for name, column in columns.items()}
+        groups = {name: column[:n].reshape(-1, self.decimate) for name, column in columns.items()}
+
+        if self.method == "boxcar":
+            z_mag, phase_rad = groups["z_mag"].mean(axis=1), groups["phase_rad"].mean(axis=1)
+        elif self.method == "median":
+            z_mag, phase_rad = np.median(groups["z_mag"], axis=1), np.median(groups["phase_rad"], axis=1)
+        else:
+            z_mag, phase_rad = groups["z_mag"][:, -1], groups["phase_rad"][:, -1]
+
+        frequency = groups["frequency"][:, -1]
+        mode = groups["mode"][:, -1]
+        phase_deg = np.degrees(phase_rad.astype(np.float64))
+        return {
+            "timestamp": groups["timestamp"].mean(axis=1),
+            "frequency": frequency,
+            "z_mag": z_mag,
+            "phase_rad": phase_rad,
+            "phase_deg": phase_deg,
+            "value": derive_values(mode, frequency, z_mag, phase_deg),
+            "mode": mode,
+            "speed": groups["speed"][:, -1],
+            "range": groups["range"][:, -1],
+            "flags": np.bitwise_or.reduce(groups["flags"], axis=1),
+        }
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "method": self.method,
+            "decimate": self.decimate,
+            "reject_flags": self.reject_flags,
+            "rejected": self.rejected,
+            "pending": 0 if self._pending is None else len(self._pending["timestamp"]),
+        }
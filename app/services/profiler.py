@@ -0,0 +1,131 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Any, Optional
+
+# Functions that start a named span; stack frames above them (asyncio and
+# server machinery) are dropped from the report
+SPAN_ROOTS = {"measurement_worker", "send_command"}
+# Request handlers are span roots too
+HANDLER_MODULE = os.path.join("app", "api", "endpoints.py")
+# Frames kept below a span root
+MAX_DEPTH = 40
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{code.co_name}"
+
+
+def collapse(frame, thread_name: str) -> str:
+    """Collapsed-stack line (root first) for one sampled frame"""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+
+    root = None
+    for i, f in enumerate(frames):
+        if f.f_code.co_name in SPAN_ROOTS or f.f_code.co_filename.endswith(HANDLER_MODULE):
+            root = i
+            break
+
+    if root is not None:
+        frames = frames[root:]
+    elif thread_name == "event_loop":
+        # Loop machinery: keep only the callback being run, if any
+        names = [f.f_code.co_name for f in frames]
+        if "_run_once" in names:
+            frames = frames[len(names) - names[::-1].index("_run_once") :]
+        if not frames or frames[-1].f_code.co_name in ["select", "poll"]:
+            return f"{thread_name};idle"
+    else:
+        # Serial I/O thread: start at the function submitted to the executor
+        names = [f.f_code.co_name for f in frames]
+        if "_guarded" not in names:
+            return f"{thread_name};idle" if names and names[-1] == "_worker" else f"{thread_name};executor"
+        frames = frames[names.index("_guarded") + 1 :]
+    return ";".join([thread_name] + [frame_label(f) for f in frames[:MAX_DEPTH]])
+
+
+class SamplingProfiler:
+    """Statistical profiler for the event loop and serial I/O threads.
+
+    A background thread samples the stacks of the event loop thread and
+    every serial executor thread each interval seconds, for at most
+    duration seconds. Stacks are cut at the span roots (measurement_worker,
+    send_command, API handlers) and counted in the collapsed format that
+    flamegraph.pl and speedscope read.
+    """
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self.interval = 0.005
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self._loop_thread: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration: float = 10.0, interval: float = 0.005) -> None:
+        """Start sampling; must be called from the event loop thread"""
+        if self.is_running:
+            return
+        self.counts = Counter()
+        self.samples = 0
+        self.interval = interval
+        self.started_at = time.time()
+        self.stopped_at = None
+        self._loop_thread = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, args=(duration,), name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self.is_running:
+            self._stop.set()
+            self._thread.join()
+
+    def _threads(self) -> Dict[int, str]:
+        threads = {self._loop_thread: "event_loop"}
+        for thread in threading.enumerate():
+            if thread.name.startswith("serial"):
+                threads[thread.ident] = "serial"
+        return threads
+
+    def _sample(self, duration: float) -> None:
+        deadline = time.monotonic() + duration
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            threads = self._threads()
+            for ident, frame in sys._current_frames().items():
+                name = threads.get(ident)
+                if name is not None:
+                    self.counts[collapse(frame, name)] += 1
+            self.samples += 1
+        self.stopped_at = time.time()
+
+    def report(self) -> str:
+        """Collapsed stacks, one "frame;frame;... count" line per distinct stack"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self.is_running,
+            "samples": self.samples,
+            "interval": self.interval,
+            "stacks": len(self.counts),
+            "started_at": self.started_at,
+            "stopped_at": self.stopped_at,
+        }
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,59 @@
+import json
+from typing import Dict, Any
+
+import numpy as np
+
+from app.services.buffer import to_records
+from app.services.decoder import derive_values
+from app.services.export import CODE_TABLES
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib encoder
+    orjson = None
+
+# Accept header value that selects the columnar layout
+COLUMNAR_MEDIA_TYPE = "application/vnd.lcr.columnar+json"
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode to compact UTF-8 JSON, NaN as null"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def columnar(columns: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """Buffer columns as one array per field, with short keys.
+
+    t is the Unix timestamp, mode and speed are codes (see "codes"), and
+    value is null where the mode has no derived value.
+    """
+    phase_deg = np.degrees(columns["phase_rad"].astype(np.float64))
+    value = derive_values(columns["mode"], columns["frequency"], columns["z_mag"], phase_deg)
+    payload = {
+        "seq": columns["seq"],
+        "t": columns["timestamp"],
+        "f": columns["frequency"],
+        "z": columns["z_mag"],
+        "phase": phase_deg,
+        "value": value,
+        "mode": columns["mode"],
+        "speed": columns["speed"],
+        "range": columns["range"],
+        "flags": columns["flags"],
+        "codes": CODE_TABLES,
+    }
+    if orjson is None:
+        payload = {
+            name: [None if x != x else x for x in column.tolist()] if isinstance(column, np.ndarray) else column
+            for name, column in payload.items()
+        }
+    return payload
+
+
+def encode_measurements(columns: Dict[str, np.ndarray], fmt: str = "records") -> bytes:
+    """Encode buffer columns as a JSON list of measurement dicts or a columnar object"""
+    if fmt == "columnar":
+        return dumps(columnar(columns))
+    return dumps(to_records(columns))
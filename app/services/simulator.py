@@ -0,0 +1,303 @@
+"""Protocol-level E7-28 simulator.
+
+E728Simulator answers the same binary commands as the meter. It can run
+in-process behind LoopbackSerial, a pyserial-compatible object that the
+transport opens for ports named ``sim://``:
+
+    sim://?latency=0.02&jitter=0.005&drop_rate=0.001&corrupt_rate=0.001
+    sim://?max_rate=1
+    sim://?baudrate=115200
+
+A host opening the port at a different baud rate than the simulated
+meter's gets garbage, as with real hardware.
+
+It can also serve a pseudo-terminal for tools that need a real device path:
+
+    python -m app.services.simulator --latency 0.02
+
+In tests, ``open_loopback()`` or ``Meter()`` connected to ``sim://`` gives a
+hardware-free meter fixture.
+"""
+
+import argparse
+import cmath
+import math
+import os
+import random
+import struct
+import threading
+import time
+from collections import deque
+from typing import Optional
+from urllib.parse import urlsplit, parse_qsl
+
+# Parameter bytes following AA + command for commands that take any
+REQUEST_PARAMS = {67: 4, 70: 2, 72: 1}
+
+
+class E728Simulator:
+    """Model of an E7-28 meter at the byte level.
+
+    Requests are parsed from the incoming byte stream, resynchronizing on
+    0xAA after garbage. Replies become readable after ``latency`` seconds
+    plus uniform ``jitter`` and the wire time at ``baudrate``, one request at
+    a time like the real instrument. ``drop_rate`` and ``corrupt_rate`` are
+    per-byte probabilities of losing or flipping a reply byte. ``max_rate``
+    disables latency and wire time.
+
+    The device under test is a series R-L circuit with ``noise`` relative
+    spread on |Z|.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        drop_rate: float = 0.0,
+        corrupt_rate: float = 0.0,
+        max_rate: bool = False,
+        baudrate: int = 9600,
+        resistance: float = 100.0,
+        inductance: float = 1e-3,
+        noise: float = 0.001,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.corrupt_rate = corrupt_rate
+        self.max_rate = max_rate
+        self.baudrate = baudrate
+        self.resistance = resistance
+        self.inductance = inductance
+        self.noise = noise
+        self.random = random.Random(seed)
+
+        # Device state
+        self.frequency = 1000.0
+        self.mode = 3  # Z
+        self.speed = 1  # normal
+        self.range = 0  # auto
+        self.offset = 0.0
+        self.requests = 0
+        self.measurements = 0
+
+        self._rx = bytearray()
+        self._busy_until = 0.0
+
+    def garble(self, data: bytes) -> bytes:
+        """What arrives when the two ends of the line disagree on the baud rate"""
+        return bytes(self.random.randrange(256) for _ in data)
+
+    def reset(self) -> None:
+        self.frequency = 1000.0
+        self.mode = 3
+        self.speed = 1
+        self.range = 0
+        self.offset = 0.0
+
+    def feed(self, data: bytes, now: float) -> list:
+        """Consume request bytes, returning (ready_time, reply) pairs"""
+        self._rx += data
+        replies = []
+        while True:
+            start = self._rx.find(0xAA)
+            if start < 0:
+                self._rx.clear()
+                break
+            del self._rx[:start]
+            if len(self._rx) < 2:
+                break
+            command = self._rx[1]
+            size = 2 + REQUEST_PARAMS.get(command, 0)
+            if len(self._rx) < size:
+                break
+            params = bytes(self._rx[2:size])
+            del self._rx[:size]
+
+            reply = self._apply_faults(self.process_command(command, params))
+            self.requests += 1
+            replies.append((self._schedule(now, len(reply)), reply))
+        return replies
+
+    def _schedule(self, now: float, size: int) -> float:
+        if self.max_rate:
+            return now
+        delay = max(self.latency + self.random.uniform(-self.jitter, self.jitter), 0.0)
+        wire_time = size * 10 / self.baudrate
+        self._busy_until = max(now, self._busy_until) + delay + wire_time
+        return self._busy_until
+
+    def _apply_faults(self, reply: bytes) -> bytes:
+        if not (self.drop_rate or self.corrupt_rate):
+            return reply
+        out = bytearray()
+        for byte in reply:
+            if self.random.random() < self.drop_rate:
+                continue
+            if self.random.random() < self.corrupt_rate:
+                byte ^= 1 << self.random.randrange(8)
+            out.append(byte)
+        return bytes(out)
+
+    def process_command(self, command: int, params: bytes) -> bytes:
+        """Reply to one request according to the protocol"""
+        if command == 64:  # Device name
+            return bytes([0xAA, command]) + b"E728"
+        elif command == 65:  # Device ID
+            return bytes([0xAA, command]) + b"0001"
+        elif command == 67:  # Set frequency, Hz * 100
+            self.frequency = struct.unpack(">I", params)[0] / 100.0
+        elif command == 70:  # Set offset, * 10
+            self.offset = struct.unpack(">h", params)[0] / 10.0
+        elif command == 71:  # Reset to defaults
+            self.reset()
+        elif command == 72:  # Measurement
+            return self.measurement_frame()
+        return bytes([0xAA, command])
+
+    def measurement_frame(self) -> bytes:
+        self.measurements += 1
+        omega = 2 * math.pi * self.frequency
+        z = complex(self.resistance, omega * self.inductance)
+        z_mag = abs(z) * (1 + self.random.gauss(0, self.noise))
+        record = bytes([0x80, self.mode, self.speed, self.range, 0, 0, 0, 0])
+        record += struct.pack(">Iff", int(round(self.frequency * 100)), z_mag, cmath.phase(z))
+        return bytes([0xAA, 72]) + record
+
+
+class LoopbackSerial:
+    """In-memory stand-in for serial.Serial connected to an E728Simulator"""
+
+    def __init__(self, simulator: E728Simulator, timeout: Optional[float] = 1.0, baudrate: int = 9600):
+        self.simulator = simulator
+        self.timeout = timeout
+        self.baudrate = baudrate
+        self.is_open = True
+        self._pending = deque()  # (ready_time, reply) not yet on the wire
+        self._rx = bytearray()
+        self._cond = threading.Condition()
+
+    def _release(self, now: float) -> None:
+        while self._pending and self._pending[0][0] <= now:
+            self._rx += self._pending.popleft()[1]
+
+    @property
+    def in_waiting(self) -> int:
+        with self._cond:
+            self._release(time.monotonic())
+            return len(self._rx)
+
+    def write(self, data: bytes) -> int:
+        with self._cond:
+            if self.baudrate != self.simulator.baudrate:
+                # Both sides see framing garbage instead of each other's bytes
+                replies = self.simulator.feed(self.simulator.garble(data), time.monotonic())
+                replies = [(ready, self.simulator.garble(reply)) for ready, reply in replies]
+            else:
+                replies = self.simulator.feed(data, time.monotonic())
+            self._pending.extend(replies)
+            self._cond.notify_all()
+        return len(data)
+
+    def read(self, size: int = 1) -> bytes:
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._release(now)
+                if len(self._rx) >= size or (deadline is not None and now >= deadline):
+                    break
+                wait = None if deadline is None else deadline - now
+                if self._pending:
+                    next_ready = self._pending[0][0] - now
+                    wait = next_ready if wait is None else min(wait, next_ready)
+                self._cond.wait(wait)
+            data = bytes(self._rx[:size])
+            del self._rx[:size]
+            return data
+
+    def reset_input_buffer(self) -> None:
+        with self._cond:
+            self._release(time.monotonic())
+            self._rx.clear()
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.is_open = False
+
+
+def simulator_from_url(url: str) -> E728Simulator:
+    """Build a simulator from a sim://?option=value port name"""
+    options = {}
+    for key, value in parse_qsl(urlsplit(url).query):
+        if key == "max_rate":
+            options[key] = value.lower() in ["1", "true", "yes"]
+        elif key in ["baudrate", "seed"]:
+            options[key] = int(value)
+        else:
+            options[key] = float(value)
+    return E728Simulator(**options)
+
+
+def open_loopback(timeout: Optional[float] = 1.0, **options) -> LoopbackSerial:
+    """Loopback serial port talking to a fresh simulator"""
+    return LoopbackSerial(E728Simulator(**options), timeout=timeout)
+
+
+def serve_pty(simulator: E728Simulator) -> str:
+    """Serve the simulator on a pseudo-terminal, returning the device path"""
+    import tty
+
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    # A pty has no line speed of its own, so the host always matches the simulated baud rate
+    port = LoopbackSerial(simulator, timeout=None, baudrate=simulator.baudrate)
+
+    def pump_requests():
+        while True:
+            data = os.read(master, 4096)
+            if not data:
+                break
+            port.write(data)
+
+    def pump_replies():
+        while True:
+            data = port.read(1)
+            os.write(master, data + port.read(port.in_waiting))
+
+    threading.Thread(target=pump_requests, daemon=True).start()
+    threading.Thread(target=pump_replies, daemon=True).start()
+    return os.ttyname(slave)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="E7-28 protocol simulator on a pseudo-terminal")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--corrupt-rate", type=float, default=0.0)
+    parser.add_argument("--max-rate", action="store_true")
+    parser.add_argument("--baudrate", type=int, default=9600)
+    args = parser.parse_args()
+
+    simulator = E728Simulator(
+        latency=args.latency,
+        jitter=args.jitter,
+        drop_rate=args.drop_rate,
+        corrupt_rate=args.corrupt_rate,
+        max_rate=args.max_rate,
+        baudrate=args.baudrate,
+    )
+    print(f"Simulated E7-28 on {serve_pty(simulator)}. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.circuit import equivalent_circuit
+from app.services.decoder import MODE_CODES, MODE_QUANTITIES, MODE_UNITS
+from app.services.stream import MeasurementStream
+
+
+class Sorter:
+    """Pass/fail binning of components against a nominal value.
+
+    The sorted quantity is the value of mode (Ls for L, Cs for C, Rs for R,
+    |Z| for Z, ...), computed from each sample's |Z|, θ and frequency, so it
+    does not depend on the mode the meter is set to. bins are tolerances in
+    percent, tightest first. A sample lands in the first bin whose tolerance
+    covers its deviation from nominal, in "fail" if none does, and in
+    "invalid" if the quantity is undefined for it. Every sample is counted;
+    result events are only built while someone is subscribed to results.
+    """
+
+    def __init__(self, nominal: float, bins: List[float], mode: str = "C", frequency: Optional[float] = None):
+        self.nominal = float(nominal)
+        self.bins = sorted(float(tolerance) for tolerance in bins)
+        self.mode = mode
+        self.quantity = MODE_QUANTITIES.get(MODE_CODES[mode])  # None for |Z|
+        self.frequency = frequency
+        self.labels = [f"±{tolerance:g}%" for tolerance in self.bins] + ["fail", "invalid"]
+        self.results = MeasurementStream()
+        self.reset()
+
+    def reset(self) -> None:
+        self.counts = np.zeros(len(self.labels), dtype=np.int64)
+        self.started_at = time.time()
+
+    def quantity_values(self, columns: Dict[str, np.ndarray]) -> np.ndarray:
+        """The sorted quantity of each sample"""
+        if self.quantity is None:
+            return columns["z_mag"].astype(np.float64)
+        derived = equivalent_circuit(columns["frequency"], columns["z_mag"], columns["phase_rad"], [self.quantity])
+        return derived[self.quantity]
+
+    def classify(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Bin index of each value, and its deviation from nominal in percent"""
+        with np.errstate(invalid="ignore"):
+            deviation = (values - self.nominal) / self.nominal * 100
+            bins = np.searchsorted(self.bins, np.abs(deviation), side="left")
+        bins[~np.isfinite(deviation)] = len(self.labels) - 1
+        return bins, deviation
+
+    def evaluate(self, columns: Dict[str, np.ndarray]) -> None:
+        """Sort a block of stored samples (with seq and timestamp columns)"""
+        values = self.quantity_values(columns)
+        bins, deviation = self.classify(values)
+        self.counts += np.bincount(bins, minlength=len(self.labels))
+        if not self.results.subscribers:
+            return
+
+        fail = len(self.bins)
+        for seq, timestamp, value, dev, index in zip(
+            columns["seq"].tolist(),
+            columns["timestamp"].tolist(),
+            values.tolist(),
+            deviation.tolist(),
+            bins.tolist(),
+        ):
+            self.results.publish(
+                {
+                    "seq": seq,
+                    "timestamp": timestamp,
+                    "value": value if value == value else None,
+                    "deviation": dev if dev == dev else None,
+                    "bin": self.labels[index],
+                    "pass": index < fail,
+                }
+            )
+
+    def info(self) -> Dict[str, Any]:
+        total = int(self.counts.sum())
+        passed = int(self.counts[: len(self.bins)].sum())
+        return {
+            "nominal": self.nominal,
+            "unit": MODE_UNITS.get(MODE_CODES.get(self.mode), ""),
+            "mode": self.mode,
+            "quantity": self.quantity or "Z",
+            "frequency": self.frequency,
+            "bins": self.bins,
+            "counts": dict(zip(self.labels, self.counts.tolist())),
+            "total": total,
+            "yield": passed / total if total else None,
+            "started_at": self.started_at,
+        }
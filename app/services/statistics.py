@@ -0,0 +1,192 @@
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+# Channels summarized for every device
+STATS_CHANNELS = ["z_mag", "phase_deg", "value"]
+# Samples covered by the windowed min/max, kept in blocks of STATS_BLOCK
+STATS_WINDOW = 1000
+STATS_BLOCK = 100
+# Averaging times of the Allan deviation, in samples: 1, 2, 4, ... MAX_TAU
+MAX_TAU = 2**14
+# Samples queued before the statistics are brought up to date
+PENDING_LIMIT = 1024
+
+
+class ChannelStats:
+    """Running statistics of one channel, updated a block of samples at a time.
+
+    - mean and variance by Welford's algorithm, merging each block with
+      Chan's parallel formula;
+    - all-time min/max, and min/max over the last STATS_WINDOW samples
+      (at STATS_BLOCK granularity);
+    - overlapping Allan deviation for averaging times of 1, 2, 4, ...
+      MAX_TAU samples. Every new sample adds one term per octave, computed
+      from cumulative sums, so no sample history beyond 2 * MAX_TAU sums is
+      kept.
+
+    NaN samples (e.g. value in modes without one) are ignored.
+    """
+
+    def __init__(self):
+        self.taus = [2**i for i in range(MAX_TAU.bit_length())]
+        self.reset()
+
+    def reset(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.last: Optional[float] = None
+        self._blocks = deque(maxlen=STATS_WINDOW // STATS_BLOCK)  # (min, max) of full blocks
+        self._block: List[float] = []  # Current partial block
+        self._offset: Optional[float] = None
+        self._sums = np.zeros(1)  # Trailing cumulative sums of (sample - offset), starting from 0
+        self._adev_sums = np.zeros(len(self.taus))
+        self._adev_counts = np.zeros(len(self.taus), dtype=np.int64)
+
+    def update(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        self._update_moments(values)
+        self._update_window(values)
+        self._update_allan(values)
+        self.last = float(values[-1])
+
+    def _update_moments(self, values: np.ndarray) -> None:
+        n = len(values)
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def _update_window(self, values: np.ndarray) -> None:
+        values = values.tolist() if len(values) < STATS_BLOCK else values
+        start = STATS_BLOCK - len(self._block)
+        self._block.extend(values[:start])
+        if len(self._block) < STATS_BLOCK:
+            return
+        self._blocks.append((min(self._block), max(self._block)))
+        rest = np.asarray(values[start:])
+        full = len(rest) // STATS_BLOCK * STATS_BLOCK
+        if full:
+            blocks = rest[:full].reshape(-1, STATS_BLOCK)[-self._blocks.maxlen :]
+            self._blocks.extend(zip(blocks.min(axis=1).tolist(), blocks.max(axis=1).tolist()))
+        self._block = rest[full:].tolist()
+
+    def _update_allan(self, values: np.ndarray) -> None:
+        if self._offset is None:
+            # Keeps the cumulative sums small, for precision
+            self._offset = float(values[0])
+        sums = np.concatenate((self._sums, self._sums[-1] + np.cumsum(values - self._offset)))
+        history = len(self._sums)
+        for i, m in enumerate(self.taus):
+            start = max(history, 2 * m)
+            if start >= len(sums):
+                break
+            end = len(sums)
+            # Difference of adjacent m-sample averages, for each new end point
+            d = (sums[start:end] - 2 * sums[start - m : end - m] + sums[start - 2 * m : end - 2 * m]) / m
+            self._adev_sums[i] += float(d @ d)
+            self._adev_counts[i] += len(d)
+        self._sums = sums[-2 * MAX_TAU :]
+
+    def summary(self, tau0: Optional[float] = None) -> Dict[str, Any]:
+        """Current statistics; tau0 is the sample period used to express tau in seconds"""
+        window = list(self._blocks)
+        if self._block:
+            window.append((min(self._block), max(self._block)))
+        allan = [
+            {
+                "tau": m,
+                "tau_s": m * tau0 if tau0 else None,
+                "adev": float(np.sqrt(total / (2 * count))),
+                "terms": int(count),
+            }
+            for m, total, count in zip(self.taus, self._adev_sums, self._adev_counts)
+            if count
+        ]
+        return {
+            "count": self.count,
+            "mean": self.mean if self.count else None,
+            "std": float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else None,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "last": self.last,
+            "window_min": min(low for low, _ in window) if window else None,
+            "window_max": max(high for _, high in window) if window else None,
+            "allan": allan,
+        }
+
+
+class StatisticsEngine:
+    """Statistics of a device's z_mag, phase_deg and value since the last reset.
+
+    Samples are queued as they are recorded and folded into the statistics
+    in blocks (every PENDING_LIMIT samples, or when a summary is requested),
+    which keeps the per-sample cost to a list append.
+    """
+
+    def __init__(self):
+        self.channels = {name: ChannelStats() for name in STATS_CHANNELS}
+        self.reset()
+
+    def reset(self) -> None:
+        for channel in self.channels.values():
+            channel.reset()
+        self._pending: Dict[str, List[float]] = {name: [] for name in STATS_CHANNELS}
+        self.first_timestamp: Optional[float] = None
+        self.last_timestamp: Optional[float] = None
+        self.samples = 0
+
+    def add(self, measurement: Dict[str, Any], timestamp: float) -> None:
+        """Queue one measurement dict"""
+        pending = self._pending
+        pending["z_mag"].append(measurement["z_mag"])
+        pending["phase_deg"].append(measurement["phase_deg"])
+        pending["value"].append(measurement.get("value", np.nan))
+        self._count(timestamp, timestamp, 1)
+        if len(pending["z_mag"]) >= PENDING_LIMIT:
+            self.flush()
+
+    def add_batch(self, columns: Dict[str, np.ndarray]) -> None:
+        """Add a block of decoded frames with a timestamp column"""
+        for name, pending in self._pending.items():
+            pending.extend(columns[name].tolist())
+        self._count(float(columns["timestamp"][0]), float(columns["timestamp"][-1]), len(columns["timestamp"]))
+        if len(self._pending["z_mag"]) >= PENDING_LIMIT:
+            self.flush()
+
+    def _count(self, first: float, last: float, n: int) -> None:
+        if self.first_timestamp is None:
+            self.first_timestamp = first
+        self.last_timestamp = last
+        self.samples += n
+
+    def flush(self) -> None:
+        if not self._pending["z_mag"]:
+            return
+        for name, channel in self.channels.items():
+            channel.update(self._pending[name])
+            self._pending[name] = []
+
+    def summary(self) -> Dict[str, Any]:
+        self.flush()
+        tau0 = None
+        if self.samples > 1:
+            tau0 = (self.last_timestamp - self.first_timestamp) / (self.samples - 1)
+        return {
+            "samples": self.samples,
+            "sample_period": tau0,
+            "since": self.first_timestamp,
+            "channels": {name: channel.summary(tau0) for name, channel in self.channels.items()},
+        }
@@ -0,0 +1,278 @@
+import asyncio
+import json
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+import aiosqlite
+import numpy as np
+
+from app.services.buffer import FIELDS
+from app.services.downsample import lttb
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER,
+    seq INTEGER NOT NULL,
+    timestamp REAL NOT NULL,
+    frequency REAL NOT NULL,
+    z_mag REAL NOT NULL,
+    phase_rad REAL NOT NULL,
+    mode INTEGER NOT NULL,
+    speed INTEGER NOT NULL,
+    range INTEGER NOT NULL,
+    flags INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_session_time ON samples (session_id, timestamp);
+CREATE INDEX IF NOT EXISTS samples_time ON samples (timestamp);
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    device_id TEXT,
+    name TEXT,
+    config TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    stopped_at REAL
+);
+"""
+
+SAMPLE_COLUMNS = [
+    "session_id",
+    "seq",
+    "timestamp",
+    "frequency",
+    "z_mag",
+    "phase_rad",
+    "mode",
+    "speed",
+    "range",
+    "flags",
+]
+
+# Columns returned by sample queries, in buffer-column form
+QUERY_COLUMNS = ["seq"] + [name for name, _ in FIELDS]
+
+# Channels that can drive server-side downsampling
+DOWNSAMPLE_CHANNELS = ["z_mag", "phase_rad"]
+
+INSERT_SAMPLE = f"INSERT INTO samples ({', '.join(SAMPLE_COLUMNS)}) VALUES ({', '.join('?' * len(SAMPLE_COLUMNS))})"
+
+
+class MeasurementStore:
+    """SQLite measurement history fed by a background batching writer.
+
+    The acquisition path only puts rows on an in-memory queue. The writer
+    task commits them in one transaction per batch, after batch_size rows or
+    flush_interval seconds, whichever comes first. If the disk cannot keep up
+    and the queue fills, new rows are dropped and counted rather than
+    slowing acquisition down.
+    """
+
+    def __init__(self, path: str, batch_size: int = 1000, flush_interval: float = 0.25, queue_size: int = 100_000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.db: Optional[aiosqlite.Connection] = None
+        self.written = 0
+        self.dropped = 0
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._closing: Optional[asyncio.Event] = None  # Cuts the flush_interval wait short on close
+
+    async def open(self) -> None:
+        """Open the database and start the writer task"""
+        self.db = await aiosqlite.connect(self.path)
+        await self.db.execute("PRAGMA journal_mode=WAL")
+        await self.db.execute("PRAGMA synchronous=NORMAL")
+        await self.db.executescript(SCHEMA)
+        await self._migrate()
+        await self.db.commit()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._closing = asyncio.Event()
+        self._writer_task = asyncio.create_task(self._writer(), name="measurement_store_writer")
+
+    async def _migrate(self) -> None:
+        """Add columns introduced after a database was created"""
+        async with self.db.execute("PRAGMA table_info(sessions)") as cursor:
+            columns = [row[1] for row in await cursor.fetchall()]
+        if "device_id" not in columns:
+            await self.db.execute("ALTER TABLE sessions ADD COLUMN device_id TEXT")
+
+    async def close(self) -> None:
+        """Flush pending rows and close the database"""
+        if self._writer_task is not None:
+            await self._queue.put(None)
+            self._closing.set()
+            await self._writer_task
+            self._writer_task = None
+        if self.db is not None:
+            await self.db.close()
+            self.db = None
+
+    def add(self, row: Tuple) -> None:
+        """Queue one row in SAMPLE_COLUMNS order (event loop thread only)"""
+        if self._writer_task is None:
+            return
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _writer(self) -> None:
+        while True:
+            rows = [await self._queue.get()]
+            if self._queue.qsize() < self.batch_size and rows[0] is not None and not self._closing.is_set():
+                try:
+                    await asyncio.wait_for(self._closing.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            while len(rows) < self.batch_size and not self._queue.empty():
+                rows.append(self._queue.get_nowait())
+
+            closing = None in rows
+            await self._write([row for row in rows if row is not None])
+            if closing:
+                # Rows queued after the close request still get written
+                rows = [self._queue.get_nowait() for _ in range(self._queue.qsize())]
+                await self._write([row for row in rows if row is not None])
+                return
+
+    async def _write(self, rows: List[Tuple]) -> None:
+        if not rows:
+            return
+        try:
+            await self.db.executemany(INSERT_SAMPLE, rows)
+            await self.db.commit()
+            self.written += len(rows)
+        except Exception as e:
+            print(f"Storage error: {str(e)}")
+
+    async def query(
+        self,
+        session_id: Optional[int] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        limit: int = 10_000,
+    ) -> Dict[str, np.ndarray]:
+        """Stored samples as buffer-style columns, ordered by time"""
+        conditions, params = [], []
+        if session_id is not None:
+            conditions.append("session_id = ?")
+            params.append(session_id)
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("timestamp <= ?")
+            params.append(end)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        sql = f"SELECT {', '.join(QUERY_COLUMNS)} FROM samples {where} ORDER BY timestamp LIMIT ?"
+        async with self.db.execute(sql, params + [limit]) as cursor:
+            rows = await cursor.fetchall()
+        return rows_to_columns(rows, QUERY_COLUMNS)
+
+    async def start_session(self, name: Optional[str], config: Dict[str, Any], device_id: Optional[str] = None) -> int:
+        """Create a session record for a new run and return its id"""
+        cursor = await self.db.execute(
+            "INSERT INTO sessions (device_id, name, config, started_at) VALUES (?, ?, ?, ?)",
+            (device_id, name, json.dumps(config), time.time()),
+        )
+        await self.db.commit()
+        return cursor.lastrowid
+
+    async def stop_session(self, session_id: int) -> None:
+        await self.db.execute("UPDATE sessions SET stopped_at = ? WHERE id = ?", (time.time(), session_id))
+        await self.db.commit()
+
+    async def list_sessions(self) -> List[Dict[str, Any]]:
+        async with self.db.execute(
+            "SELECT id, device_id, name, config, started_at, stopped_at FROM sessions ORDER BY id DESC"
+        ) as cursor:
+            rows = await cursor.fetchall()
+        return [session_record(row) for row in rows]
+
+    async def get_session(self, session_id: int) -> Optional[Dict[str, Any]]:
+        async with self.db.execute(
+            "SELECT id, device_id, name, config, started_at, stopped_at FROM sessions WHERE id = ?", (session_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        return session_record(row) if row else None
+
+    async def downsample(
+        self,
+        session_id: int,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        points: int = 2000,
+        method: str = "minmax",
+        channel: str = "z_mag",
+    ) -> Dict[str, np.ndarray]:
+        """Session samples reduced to about `points` rows.
+
+        minmax splits the time range into points / 2 buckets and keeps the rows
+        holding the minimum and maximum of `channel` in each, computed by
+        SQLite over the (session_id, timestamp) index. lttb first does the same
+        with 4x the buckets, then applies Largest-Triangle-Three-Buckets to get
+        exactly `points` rows.
+        """
+        if channel not in DOWNSAMPLE_CHANNELS:
+            raise ValueError(f"Unknown channel: {channel}")
+
+        async with self.db.execute(
+            "SELECT MIN(timestamp), MAX(timestamp) FROM samples WHERE session_id = ?"
+            " AND timestamp >= ? AND timestamp <= ?",
+            (session_id, -np.inf if start is None else start, np.inf if end is None else end),
+        ) as cursor:
+            first, last = await cursor.fetchone()
+        if first is None:
+            return rows_to_columns([], QUERY_COLUMNS)
+
+        buckets = max(points * 2 if method == "lttb" else points // 2, 1)
+        width = (last - first) / buckets or 1.0
+        rows = {}
+        for aggregate in ["MIN", "MAX"]:
+            # SQLite returns the bare columns from the row holding the MIN/MAX
+            selected = [f"{aggregate}({name})" if name == channel else name for name in QUERY_COLUMNS]
+            sql = (
+                f"SELECT {', '.join(selected)} FROM samples"
+                " WHERE session_id = ? AND timestamp >= ? AND timestamp <= ?"
+                " GROUP BY CAST((timestamp - ?) / ? AS INTEGER)"
+            )
+            async with self.db.execute(sql, (session_id, first, last, first, width)) as cursor:
+                for row in await cursor.fetchall():
+                    rows[(row[1], row[0])] = row
+        columns = rows_to_columns([rows[key] for key in sorted(rows)], QUERY_COLUMNS)
+
+        if method == "lttb":
+            keep = lttb(columns["timestamp"], columns[channel].astype(np.float64), points)
+            columns = {name: column[keep] for name, column in columns.items()}
+        return columns
+
+    def stats(self) -> Dict[str, Any]:
+        """Writer counters and the number of rows waiting to be written"""
+        return {
+            "path": self.path,
+            "written": self.written,
+            "pending": self._queue.qsize() if self._queue else 0,
+            "dropped": self.dropped,
+        }
+
+
+def session_record(row: Tuple) -> Dict[str, Any]:
+    session_id, device_id, name, config, started_at, stopped_at = row
+    return {
+        "id": session_id,
+        "device": device_id,
+        "name": name,
+        "config": json.loads(config),
+        "started_at": started_at,
+        "stopped_at": stopped_at,
+    }
+
+
+def rows_to_columns(rows: List[Tuple], names: List[str]) -> Dict[str, np.ndarray]:
+    """Transpose query rows into typed NumPy columns"""
+    dtypes = dict(FIELDS, seq=np.int64)
+    values = list(zip(*rows)) if rows else [()] * len(names)
+    return {name: np.array(column, dtype=dtypes[name]) for name, column in zip(names, values)}
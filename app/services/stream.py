@@ -0,0 +1,40 @@
+import asyncio
+from typing import Dict, Any, Set
+
+
+class MeasurementStream:
+    """Fan-out of new measurements to live subscribers.
+
+    Every subscriber gets its own bounded queue. When a client falls behind
+    its queue is full, the oldest pending sample is dropped and counted, so a
+    slow dashboard never grows server memory or stalls acquisition.
+    """
+
+    def __init__(self, queue_size: int = 1000):
+        self.queue_size = queue_size
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.dropped = 0
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self.subscribers.discard(queue)
+
+    def publish(self, measurement: Dict[str, Any]) -> None:
+        """Queue a measurement for every subscriber (event loop thread only)"""
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(measurement)
+
+
+def drain(queue: asyncio.Queue, first: Any, limit: int) -> list:
+    """Collect an item plus whatever is already queued, up to limit items"""
+    batch = [first]
+    while len(batch) < limit and not queue.empty():
+        batch.append(queue.get_nowait())
+    return batch
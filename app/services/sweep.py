@@ -0,0 +1,127 @@
+import asyncio
+import time
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from app.services.meter import Meter
+from app.services.decoder import MODE_NAMES, MODE_UNITS, derive_values
+from app.services.stream import MeasurementStream
+
+
+def sweep_frequencies(start: float, stop: float, points: int, scale: str = "linear") -> np.ndarray:
+    """Frequency list for a sweep, rounded to the meter's 0.01 Hz resolution"""
+    if scale == "log":
+        frequencies = np.geomspace(start, stop, points)
+    else:
+        frequencies = np.linspace(start, stop, points)
+    return np.round(frequencies, 2)
+
+
+def average_point(columns: Dict[str, np.ndarray], method: str = "mean") -> Optional[Dict[str, Any]]:
+    """Reduce the samples taken at one frequency to a single point"""
+    count = len(columns["z_mag"])
+    if not count:
+        return None
+
+    z_mag = columns["z_mag"].astype(np.float64)
+    phase_rad = columns["phase_rad"].astype(np.float64)
+    if method == "median":
+        z_avg, phase_avg = float(np.median(z_mag)), float(np.median(phase_rad))
+    else:
+        # Average the complex impedance so phase wrap-around cannot skew the result
+        z = np.mean(z_mag * np.exp(1j * phase_rad))
+        z_avg, phase_avg = float(abs(z)), float(np.angle(z))
+
+    mode = int(columns["mode"][-1])
+    frequency = float(columns["frequency"][-1])
+    phase_deg = float(np.degrees(phase_avg))
+    point = {
+        "frequency": frequency,
+        "mode": MODE_NAMES.get(mode, "?"),
+        "z_mag": z_avg,
+        "z_std": float(np.std(z_mag)),
+        "phase_rad": phase_avg,
+        "phase_deg": phase_deg,
+        "samples": count,
+        "flags": int(np.bitwise_or.reduce(columns["flags"])),
+    }
+    value = derive_values(np.array([mode]), np.array([frequency]), np.array([z_avg]), np.array([phase_deg]))[0]
+    if not np.isnan(value):
+        point["value"] = float(value)
+        point["unit"] = MODE_UNITS[mode]
+    return point
+
+
+class SweepJob:
+    """Frequency sweep run on the server.
+
+    Each point is a single serial transaction: set frequency (command 67),
+    wait the settle time, then take samples_per_point measurements (command
+    72), so no HTTP or event-loop round-trips sit between the commands.
+    Points are published on stream as they complete.
+    """
+
+    def __init__(
+        self,
+        meter: Meter,
+        frequencies: np.ndarray,
+        settle: float = 0.0,
+        samples_per_point: int = 1,
+        average: str = "mean",
+    ):
+        self.meter = meter
+        self.frequencies = frequencies
+        self.settle = settle
+        self.samples_per_point = samples_per_point
+        self.average = average
+        self.status = "pending"
+        self.error: Optional[str] = None
+        self.results: List[Dict[str, Any]] = []
+        self.stream = MeasurementStream()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self.status == "running"
+
+    async def run(self) -> None:
+        """Measure every point in order, publishing start, point and end events"""
+        self.status = "running"
+        self.started_at = time.time()
+        self.stream.publish({"type": "start", **self.info()})
+        try:
+            for index, frequency in enumerate(self.frequencies):
+                columns = await self.meter.measure_at(float(frequency), self.samples_per_point, self.settle)
+                point = average_point(columns, self.average) if columns is not None else None
+                if point is None:
+                    point = {"frequency": float(frequency), "samples": 0}
+                point["index"] = index
+                self.results.append(point)
+                self.stream.publish({"type": "point", **point})
+            self.status = "done"
+        except asyncio.CancelledError:
+            self.status = "cancelled"
+            raise
+        except Exception as e:
+            print(f"Sweep error: {str(e)}")
+            self.status = "error"
+            self.error = str(e)
+        finally:
+            self.finished_at = time.time()
+            self.stream.publish({"type": "end", **self.info()})
+
+    def info(self) -> Dict[str, Any]:
+        """Sweep progress without the results"""
+        return {
+            "status": self.status,
+            "error": self.error,
+            "points": len(self.frequencies),
+            "completed": len(self.results),
+            "settle": self.settle,
+            "samples_per_point": self.samples_per_point,
+            "average": self.average,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
@@ -0,0 +1,283 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import serial
+
+from app.services.simulator import LoopbackSerial, simulator_from_url
+from app.services.metrics import SERIAL_LOCK_WAIT
+
+# Reconnect backoff after the port is lost, in seconds
+RECONNECT_MIN_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30.0
+# Timeouts in a row after which the port is considered dead and reopened
+MAX_CONSECUTIVE_TIMEOUTS = 5
+
+
+class SerialTransport:
+    """Asyncio front-end for a blocking pyserial port.
+
+    Every port operation runs on a dedicated single-thread executor, so a slow
+    reply from the meter never blocks the event loop and requests are executed
+    in the order they were issued.
+
+    Replies are expected to start with the request's 0xAA + command bytes.
+    A reply that does not is resynchronized by scanning ahead for that
+    header, and input left over from an incomplete reply is discarded before
+    the next request. When the port fails (an I/O error, or
+    MAX_CONSECUTIVE_TIMEOUTS timeouts in a row) it is closed and marked
+    lost, and reconnect() reopens it with exponential backoff.
+    """
+
+    def __init__(self, timeout: float = 1.0):
+        self.port: Optional[str] = None
+        self.baudrate: Optional[int] = None
+        self.timeout = timeout
+        self.serial: Optional[serial.Serial] = None
+        self.serial_lock = asyncio.Lock()
+        self.lost = False  # Port failed and should be reopened
+        self.backoff = RECONNECT_MIN_DELAY
+        self.timeouts = 0
+        self.short_reads = 0
+        self.resyncs = 0
+        self.io_errors = 0
+        self.reconnects = 0
+        self._consecutive_timeouts = 0
+        self._dirty = False  # Input may hold the remains of an incomplete reply
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="serial")
+
+    @property
+    def is_open(self) -> bool:
+        return self.serial is not None and self.serial.is_open
+
+    def counters(self) -> Dict[str, int]:
+        """Link error counters since the transport was created"""
+        return {
+            "timeouts": self.timeouts,
+            "short_reads": self.short_reads,
+            "resyncs": self.resyncs,
+            "io_errors": self.io_errors,
+            "reconnects": self.reconnects,
+        }
+
+    @asynccontextmanager
+    async def _locked(self):
+        """Hold serial_lock, recording how long it took to get it"""
+        start = time.perf_counter()
+        async with self.serial_lock:
+            SERIAL_LOCK_WAIT.observe(time.perf_counter() - start)
+            yield
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def open(self, port: str, baudrate: int = 9600) -> None:
+        """Open the port, closing any previous connection first"""
+        async with self._locked():
+            await self._run(self._close)
+            self.serial = await self._run(self._open, port, baudrate)
+            self.port = port
+            self.baudrate = baudrate
+            self.lost = False
+            self.backoff = RECONNECT_MIN_DELAY
+            self._consecutive_timeouts = 0
+
+    async def reconnect(self) -> bool:
+        """Wait out the backoff delay, then try to reopen a lost port"""
+        await asyncio.sleep(self.backoff)
+        async with self._locked():
+            if not self.lost:
+                return self.is_open
+            try:
+                self.serial = await self._run(self._open, self.port, self.baudrate)
+            except Exception as e:
+                print(f"Reconnect error: {str(e)}")
+                self.backoff = min(self.backoff * 2, RECONNECT_MAX_DELAY)
+                return False
+            self.lost = False
+            self.backoff = RECONNECT_MIN_DELAY
+            self._consecutive_timeouts = 0
+            self.reconnects += 1
+            print(f"Reconnected to {self.port}")
+            return True
+
+    async def configure(self, baudrate: Optional[int] = None, timeout: Optional[float] = None) -> None:
+        """Change the baud rate and/or read timeout of the open port, discarding pending input"""
+        async with self._locked():
+            await self._run(self._configure, baudrate, timeout)
+
+    async def close(self) -> None:
+        """Close the port if it is open"""
+        async with self._locked():
+            await self._run(self._close)
+            self.serial = None
+            self.lost = False
+
+    async def exchange(self, request: bytes, response_size: int) -> bytes:
+        """Write a request and read up to response_size bytes of reply"""
+        async with self._locked():
+            return await self._run(self._guarded, self._exchange, request, response_size)
+
+    async def pipeline(
+        self, request: bytes, response_size: int, count: int, depth: int, end_request: bytes, end_size: int
+    ) -> bytes:
+        """Send a request count times, keeping up to depth of them in flight.
+
+        end_request (with a reply of end_size bytes and a different header)
+        is sent after the last request. Replies come back in order, so once
+        its reply has arrived every request has been answered, however many
+        bytes were lost on the way, and reading stops without waiting for a
+        timeout. Returns the raw reply stream without the end reply, which
+        is shorter than count * response_size if bytes were lost.
+        """
+        async with self._locked():
+            return await self._run(
+                self._guarded, self._pipeline, request, response_size, count, depth, end_request, end_size
+            )
+
+    async def transaction(self, func: Callable[..., Any], *args) -> Any:
+        """Run func(exchange, *args) on the serial thread while holding the port.
+
+        Lets a caller chain several request/reply exchanges back-to-back without
+        releasing the lock or returning to the event loop between them.
+        """
+        async with self._locked():
+            return await self._run(self._guarded, func, self._exchange, *args)
+
+    def _open(self, port: str, baudrate: int) -> serial.Serial:
+        if port.startswith("sim://"):
+            return LoopbackSerial(simulator_from_url(port), timeout=self.timeout, baudrate=baudrate)
+        return serial.Serial(
+            port=port,
+            baudrate=baudrate,
+            bytesize=serial.EIGHTBITS,
+            parity=serial.PARITY_NONE,
+            stopbits=serial.STOPBITS_ONE,
+            timeout=self.timeout,
+        )
+
+    def _configure(self, baudrate: Optional[int], timeout: Optional[float]) -> None:
+        if baudrate is not None:
+            self.baudrate = baudrate
+        if timeout is not None:
+            self.timeout = timeout
+        if self.is_open:
+            self.serial.baudrate = self.baudrate
+            self.serial.timeout = self.timeout
+            self.serial.reset_input_buffer()
+        self._consecutive_timeouts = 0
+        self._dirty = False
+
+    def _close(self) -> None:
+        if self.serial and self.serial.is_open:
+            self.serial.close()
+
+    def _guarded(self, func, *args):
+        """Run an I/O function, marking the port lost if it fails"""
+        try:
+            return func(*args)
+        except (serial.SerialException, OSError):
+            self.io_errors += 1
+            self._mark_lost()
+            raise
+
+    def _mark_lost(self) -> None:
+        try:
+            self._close()
+        except Exception:
+            pass
+        self.serial = None
+        self.lost = True
+
+    def _count_read(self, size: int, expected: int) -> None:
+        if size >= expected:
+            self._consecutive_timeouts = 0
+            return
+        self._dirty = True
+        if size == 0:
+            self.timeouts += 1
+            self._consecutive_timeouts += 1
+            if self._consecutive_timeouts >= MAX_CONSECUTIVE_TIMEOUTS:
+                print(f"No reply from {self.port} after {self._consecutive_timeouts} timeouts, reopening")
+                self._mark_lost()
+        else:
+            self.short_reads += 1
+            self._consecutive_timeouts = 0
+
+    def _exchange(self, request: bytes, response_size: int) -> bytes:
+        if not self.is_open:
+            return b""
+        if self._dirty:
+            # Drop late bytes of an earlier reply so they are not read as this one
+            self.serial.reset_input_buffer()
+            self._dirty = False
+        self.serial.write(request)
+        data = self.serial.read(response_size)
+
+        header = request[:2]
+        if len(data) >= 2 and data[:2] != header:
+            data = self._resync(data, header, response_size)
+        self._count_read(len(data), response_size)
+        return data
+
+    def _resync(self, data: bytes, header: bytes, response_size: int) -> bytes:
+        """Skip garbage up to the next reply header, reading on to complete the reply"""
+        self.resyncs += 1
+        scanned = 0
+        while scanned < 4 * response_size:
+            if data[:2] != header:
+                start = data.find(header)
+                if start < 0:
+                    # Keep a trailing 0xAA: it may be the first half of the header
+                    start = len(data) - 1 if data[-1:] == header[:1] else len(data)
+                scanned += start
+                data = data[start:]
+            if data[:2] == header and len(data) >= response_size:
+                break
+            more = self.serial.read(response_size - len(data) if data[:2] == header else response_size)
+            if not more:
+                break
+            data += more
+        return data[:response_size] if data[:2] == header else b""
+
+    def _pipeline(
+        self, request: bytes, response_size: int, count: int, depth: int, end_request: bytes, end_size: int
+    ) -> bytes:
+        if not self.is_open:
+            return b""
+        if self._dirty:
+            self.serial.reset_input_buffer()
+            self._dirty = False
+        expected = count * response_size + end_size
+        end_header = end_request[:2]
+        sent = min(depth, count)
+        self.serial.write(request * sent + (end_request if sent == count else b""))
+        data = bytearray()
+        while len(data) < expected:
+            waiting = self.serial.in_waiting
+            if sent < count:
+                size = min(max(waiting, response_size), expected - len(data))
+            else:
+                # Every request is out: read only what has arrived (at least
+                # one byte), since lost bytes make expected an overestimate
+                size = min(max(waiting, 1), expected - len(data))
+            chunk = self.serial.read(size)
+            data += chunk
+            self._count_read(len(chunk), size)
+            if len(chunk) < size:
+                break  # Timed out: the rest of the replies were lost
+            if sent == count and data[-end_size:][:2] == end_header and len(data) >= end_size:
+                return bytes(data[:-end_size])
+            # Top the pipeline back up to depth outstanding requests
+            more = min(len(data) // response_size + depth, count) - sent
+            if more > 0:
+                sent += more
+                self.serial.write(request * more + (end_request if sent == count else b""))
+        if data[-end_size:][:2] == end_header:
+            return bytes(data[:-end_size])
+        # The end reply was damaged or lost; let the next request discard what follows
+        self._dirty = True
+        return bytes(data)
@@ -0,0 +1,216 @@
+# bench_pipeline.py
+"""End-to-end throughput benchmark: decode -> acquisition -> API -> export.
+
+Runs against the in-process E7-28 simulator and prints one JSON document,
+so results can be stored and compared between releases:
+
+    python benchmarks/bench_pipeline.py --output bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Keep the benchmark's SQLite history out of the working directory
+os.environ.setdefault("LCR_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+
+from fastapi import FastAPI
+
+from app.api.endpoints import router
+from app.services.buffer import MeasurementBuffer
+from app.services.decoder import FRAME_HEADER, decode_frames
+from app.services.devices import devices, start_worker, stop_worker
+from app.services.meter import parse_measurement
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else None
+
+
+def make_frames(count: int) -> bytes:
+    record = bytes([0x80, 3, 1, 0, 0, 0, 0, 0]) + struct.pack(">Iff", 100000, 100.5, -0.25)
+    return (FRAME_HEADER + record) * count
+
+
+def bench_decode(count: int) -> dict:
+    """Frames per second through parse_measurement and decode_frames"""
+    data = make_frames(count)
+    frame = data[:22]
+
+    start = time.perf_counter()
+    for _ in range(count):
+        parse_measurement(frame)
+    single = count / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    decode_frames(data)
+    batch = count / (time.perf_counter() - start)
+    return {"frames": count, "parse_measurement_per_s": single, "decode_frames_per_s": batch}
+
+
+async def asgi_get(app, path: str, query: str = "") -> bytes:
+    """Minimal in-process ASGI GET, so latency excludes the network stack"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [],
+        "client": ("bench", 0),
+        "server": ("bench", 80),
+    }
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return b"".join(body)
+
+
+async def bench_acquisition_and_api(port: str, duration: float, pollers: int, pipeline: int = 1) -> dict:
+    """Acquisition rate from the simulator, and API latency while it runs"""
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+
+    device = devices.default
+    await start_worker()
+    await device.meter.connect(port)
+    await device.update_config({"rate": 0, "pipeline": pipeline})
+    await device.start_measurement("benchmark")
+
+    latencies = []
+    stop_at = time.perf_counter() + duration
+
+    async def poller():
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            await asgi_get(app, "/api/get_measurements")
+            latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    if pollers:
+        await asyncio.gather(*(poller() for _ in range(pollers)))
+    else:
+        await asyncio.sleep(duration)
+    elapsed = time.perf_counter() - start
+    stats = device.get_acquisition_stats()
+
+    await stop_worker()
+    return {
+        "port": port,
+        "pipeline": pipeline,
+        "duration_s": elapsed,
+        "acquisition": {"samples": stats["samples"], "rate_per_s": stats["samples"] / elapsed, **stats},
+        "get_measurements": {
+            "pollers": pollers,
+            "requests": len(latencies),
+            "p50_ms": percentile(latencies, 50),
+            "p99_ms": percentile(latencies, 99),
+        },
+    }
+
+
+def fill_buffer(rows: int) -> MeasurementBuffer:
+    buffer = MeasurementBuffer(rows)
+    columns = buffer.columns
+    columns["timestamp"][:] = time.time() + np.arange(rows) * 0.01
+    columns["frequency"][:] = 1000.0
+    columns["z_mag"][:] = 100.0 + np.random.default_rng(0).normal(0, 0.1, rows)
+    columns["phase_rad"][:] = -0.25
+    columns["mode"][:] = 3
+    columns["speed"][:] = 1
+    buffer.count = rows
+    return buffer
+
+
+def bench_export(rows: int) -> dict:
+    """CSV export time and peak traced memory for a full buffer of `rows`"""
+    device = devices.default
+    device.measurement_data = fill_buffer(rows)
+
+    start = time.perf_counter()
+    size = sum(len(chunk) for chunk in device.export_to_csv())
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    for _ in device.export_to_csv():
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"rows": rows, "seconds": elapsed, "rows_per_s": rows / elapsed, "bytes": size, "peak_memory_bytes": peak}
+
+
+def bench_memory(rows: int) -> dict:
+    """Bytes allocated per stored sample"""
+    tracemalloc.start()
+    buffer = MeasurementBuffer(rows)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"rows": rows, "bytes_per_sample": current / rows, "column_bytes_per_sample": buffer.nbytes / rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the acquisition -> API -> export pipeline")
+    parser.add_argument("--frames", type=int, default=100_000, help="frames for the decode benchmark")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per acquisition run")
+    parser.add_argument("--pollers", type=int, default=8, help="concurrent /api/get_measurements pollers")
+    parser.add_argument("--latency", type=float, default=0.01, help="simulated meter latency in seconds")
+    parser.add_argument("--pipeline", type=int, default=8, help="requests in flight for the pipelined run")
+    parser.add_argument("--export-rows", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    results = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "decode": bench_decode(args.frames),
+        "pipeline": {
+            "acquisition_only": asyncio.run(bench_acquisition_and_api("sim://?max_rate=1", args.duration, 0)),
+            "max_rate": asyncio.run(bench_acquisition_and_api("sim://?max_rate=1", args.duration, args.pollers)),
+            "pipelined": asyncio.run(
+                bench_acquisition_and_api("sim://?max_rate=1", args.duration, args.pollers, args.pipeline)
+            ),
+            "latency": asyncio.run(
+                bench_acquisition_and_api(f"sim://?latency={args.latency}", args.duration, args.pollers)
+            ),
+        },
+        "export_csv": [bench_export(rows) for rows in args.export_rows],
+        "memory": bench_memory(1_000_000),
+    }
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
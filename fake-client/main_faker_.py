@@ -139,7 +139,7 @@ class FakeLCRMeter:
                 freq_bytes = self.serial.read(4)
                 if len(freq_bytes) == 4:
                     freq_int = struct.unpack(">I", freq_bytes)[0]
-                    self.frequency = freq_int / 10.0
+                    self.frequency = freq_int / 100.0
                     self.send_response(67)
                     print("Success")
                 else:
@@ -0,0 +1,21 @@
+import pytest
+
+from app.services.meter import Meter
+
+# Seed of the simulated meter's noise, so that runs are repeatable
+SIM_SEED = 1234
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def meter(anyio_backend):
+    """Meter connected to an in-process simulator that answers without delay"""
+    meter = Meter()
+    connected, message = await meter.connect(f"sim://?max_rate=1&seed={SIM_SEED}")
+    assert connected, message
+    yield meter
+    await meter.disconnect()
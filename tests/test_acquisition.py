@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from app.services.acquisition import AcquisitionEngine
+
+pytestmark = pytest.mark.anyio
+
+
+async def run(engine: AcquisitionEngine, seconds: float) -> None:
+    engine.start()
+    engine.resume()
+    await asyncio.sleep(seconds)
+
+
+async def test_holds_target_rate(meter):
+    samples = []
+    engine = AcquisitionEngine(meter, lambda m: samples.append(m), target_rate=50.0)
+    await run(engine, 0.5)
+    await engine.stop()
+    assert 20 <= len(samples) <= 27
+    assert engine.missed_deadlines == 0
+
+
+async def test_rate_change_applies_without_waiting_for_slot(meter):
+    samples = []
+    engine = AcquisitionEngine(meter, lambda m: samples.append(m), target_rate=0.01)
+    await run(engine, 0.1)
+    assert len(samples) == 1
+    engine.set_target_rate(50.0)
+    await asyncio.sleep(0.3)
+    await engine.stop()
+    assert len(samples) >= 10
+
+
+async def test_pause_and_resume_apply_immediately(meter):
+    samples = []
+    engine = AcquisitionEngine(meter, lambda m: samples.append(m), target_rate=0.01)
+    await run(engine, 0.1)
+    engine.pause()
+    await asyncio.sleep(0.05)
+    engine.set_target_rate(50.0)
+    engine.resume()
+    await asyncio.sleep(0.3)
+    await engine.stop()
+    assert len(samples) >= 10
+
+
+async def test_pipelined_batches(meter):
+    batches = []
+    engine = AcquisitionEngine(meter, lambda m: None, target_rate=0.0, on_batch=batches.append, pipeline_depth=8)
+    await run(engine, 0.2)
+    await engine.stop()
+    assert batches and all(len(batch["z_mag"]) == 64 for batch in batches)
+    assert all((batch["timestamp"][1:] > batch["timestamp"][:-1]).all() for batch in batches)
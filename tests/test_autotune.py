@@ -0,0 +1,36 @@
+import pytest
+import serial
+
+from app.services.meter import Meter
+from app.services.simulator import E728Simulator, serve_pty
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_autotune_finds_meter_baudrate():
+    meter = Meter()
+    await meter.connect("sim://?max_rate=1&baudrate=38400", 9600)
+    result = await meter.autotune()
+    await meter.disconnect()
+    assert result["success"]
+    assert result["baudrate"] == 38400
+    assert [candidate["baudrate"] for candidate in result["candidates"]] == [115200, 57600, 38400]
+    assert result["candidates"][0]["frame_error_rate"] == 1.0
+    assert result["frame_error_rate"] == 0.0
+
+
+async def test_autotune_restores_baudrate_when_nothing_answers():
+    meter = Meter()
+    await meter.connect("sim://?max_rate=1&baudrate=4800", 9600)
+    result = await meter.autotune([19200, 9600])
+    assert not result["success"]
+    assert meter.transport.baudrate == 9600
+    assert meter.transport.timeout == 1.0
+    await meter.disconnect()
+
+
+def test_pty_answers_at_simulated_baudrate():
+    port = serial.Serial(serve_pty(E728Simulator(baudrate=38400)), baudrate=38400, timeout=1.0)
+    port.write(bytes([0xAA, 64]))
+    assert port.read(6) == b"\xaa@E728"
+    port.close()
@@ -0,0 +1,52 @@
+import numpy as np
+
+from app.services.buffer import FIELDS, MeasurementBuffer
+
+
+def block(start: int, n: int):
+    columns = {name: np.zeros(n, dtype=dtype) for name, dtype in FIELDS}
+    columns["timestamp"] = np.arange(start, start + n, dtype=np.float64)
+    return columns
+
+
+def test_extend_wraps_and_keeps_newest():
+    buffer = MeasurementBuffer(capacity=4)
+    assert buffer.extend(block(0, 3)) == 0
+    assert buffer.extend(block(3, 3)) == 3
+    assert len(buffer) == 4
+    assert buffer.first_seq == 2
+    window = buffer.window(0, 10)
+    assert window["seq"].tolist() == [2, 3, 4, 5]
+    assert window["timestamp"].tolist() == [2.0, 3.0, 4.0, 5.0]
+
+
+def test_extend_longer_than_capacity():
+    buffer = MeasurementBuffer(capacity=4)
+    buffer.extend(block(0, 10))
+    assert buffer.window(0, 10)["timestamp"].tolist() == [6.0, 7.0, 8.0, 9.0]
+
+
+def test_since_and_last():
+    buffer = MeasurementBuffer(capacity=4)
+    buffer.extend(block(0, 6))
+    assert buffer.since(3, 10)["seq"].tolist() == [4, 5]
+    assert buffer.since(0, 3)["seq"].tolist() == [2, 3]  # seq 1 was overwritten
+    assert buffer.since(5, 10)["seq"].tolist() == []
+    assert buffer.last(2)["seq"].tolist() == [4, 5]
+
+
+def test_clear_keeps_sequence_numbers():
+    buffer = MeasurementBuffer(capacity=4)
+    buffer.extend(block(0, 3))
+    buffer.clear()
+    assert len(buffer) == 0
+    assert buffer.extend(block(3, 1)) == 3
+    assert buffer.window(0, 10)["seq"].tolist() == [3]
+
+
+def test_frequency_keeps_centihertz():
+    buffer = MeasurementBuffer(capacity=4)
+    columns = block(0, 1)
+    columns["frequency"][:] = 999999.99
+    buffer.extend(columns)
+    assert buffer.window(0, 1)["frequency"].tolist() == [999999.99]
@@ -0,0 +1,46 @@
+import math
+
+import numpy as np
+import pytest
+
+from app.services.circuit import QUANTITIES, equivalent_circuit, parse_quantities, quantity_value
+
+
+def test_series_and_parallel_equivalents():
+    # 1 mH in series with 10 Ω at 1 kHz
+    omega = 2 * math.pi * 1000
+    z = complex(10, omega * 1e-3)
+    derived = equivalent_circuit(np.array([1000.0]), np.array([abs(z)]), np.array([math.atan2(z.imag, z.real)]))
+    y = 1 / z
+    expected = {
+        "Rs": 10,
+        "Ls": 1e-3,
+        "Y": abs(y),
+        "Rp": 1 / y.real,
+        "Lp": -1 / (omega * y.imag),
+        "Q": omega * 1e-3 / 10,
+        "D": 10 / (omega * 1e-3),
+    }
+    for name, value in expected.items():
+        assert derived[name][0] == pytest.approx(value, rel=1e-9)
+
+
+def test_scalar_path_matches_arrays():
+    frequency = np.array([100.0, 1e4, 1e6, 1e3])
+    z_mag = np.array([50.0, 1e3, 0.5, 0.0])
+    phase_rad = np.array([0.3, -1.2, 1.5, 0.0])
+    derived = equivalent_circuit(frequency, z_mag, phase_rad)
+    for name in QUANTITIES:
+        for i in range(len(frequency)):
+            value = quantity_value(name, float(frequency[i]), float(z_mag[i]), float(phase_rad[i]))
+            if math.isnan(derived[name][i]):
+                assert math.isnan(value), name
+            else:
+                assert value == pytest.approx(derived[name][i], rel=1e-12), name
+
+
+def test_parse_quantities():
+    assert parse_quantities(" Ls, Q ,") == ["Ls", "Q"]
+    assert parse_quantities(None) == []
+    with pytest.raises(ValueError):
+        parse_quantities("Ls,Zp")
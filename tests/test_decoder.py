@@ -0,0 +1,92 @@
+import math
+
+import numpy as np
+
+from app.services.decoder import FRAME_SIZE, MODE_CODES, MODE_NAMES, align_frames, decode_frames, derive_values
+from app.services.meter import parse_measurement
+from app.services.simulator import E728Simulator
+
+
+def frames(*z_mags: float, frequency: float = 1000.0) -> bytes:
+    simulator = E728Simulator(noise=0.0)
+    simulator.frequency = frequency
+    data = b""
+    for z_mag in z_mags:
+        simulator.resistance = z_mag
+        simulator.inductance = 0.0
+        data += simulator.measurement_frame()
+    return data
+
+
+def test_decode_frames():
+    columns = decode_frames(frames(1.0, 2.0, 3.0, frequency=1234.5))
+    assert columns["z_mag"].tolist() == [1.0, 2.0, 3.0]
+    assert columns["frequency"].tolist() == [1234.5] * 3
+    assert columns["mode"].tolist() == [MODE_CODES["Z"]] * 3
+
+
+def test_decode_frames_skips_bad_header_and_partial_frame():
+    data = bytearray(frames(1.0, 2.0, 3.0))
+    data[FRAME_SIZE] = 0x55
+    columns = decode_frames(bytes(data) + b"\xaa\x48\x00")
+    assert columns["z_mag"].tolist() == [1.0, 3.0]
+
+
+def test_derive_values_series_rl():
+    # 100 Ω in series with 1 mH at 1 kHz
+    z = complex(100.0, 2 * math.pi * 1000.0 * 1e-3)
+    n = 3
+    mode = np.array([MODE_CODES["L"], MODE_CODES["R"], MODE_CODES["Q"]], dtype=np.uint8)
+    values = derive_values(
+        mode, np.full(n, 1000.0), np.full(n, abs(z)), np.full(n, math.degrees(math.atan2(z.imag, z.real)))
+    )
+    assert np.allclose(values, [1e-3, 100.0, z.imag / z.real])
+
+
+def test_align_frames_passes_aligned_stream_through():
+    data = frames(1.0, 2.0)
+    assert align_frames(data) == (data, 0)
+
+
+def test_align_frames_skips_leading_garbage():
+    # E.g. the tail of a reply that arrived after its read timed out
+    data = b"\x00\x13\x37" + frames(1.0, 2.0)
+    aligned, skipped = align_frames(data)
+    assert skipped == 3
+    assert decode_frames(aligned)["z_mag"].tolist() == [1.0, 2.0]
+
+
+def test_align_frames_drops_frame_that_lost_a_byte():
+    damaged = frames(2.0)
+    damaged = damaged[:10] + damaged[11:]
+    aligned, skipped = align_frames(frames(1.0) + damaged + frames(3.0))
+    assert skipped == FRAME_SIZE - 1
+    assert decode_frames(aligned)["z_mag"].tolist() == [1.0, 3.0]
+
+
+def test_align_frames_drops_trailing_garbage_after_last_header():
+    data = frames(1.0, 2.0)
+    aligned, skipped = align_frames(data + b"\xaa\x48\x00")
+    assert skipped == 3
+    assert aligned == data
+
+
+def test_parse_measurement_matches_decode_frames():
+    simulator = E728Simulator(seed=1)
+    for mode in MODE_CODES.values():
+        simulator.mode = mode
+        frame = simulator.measurement_frame()
+        measurement = parse_measurement(frame)
+        columns = decode_frames(frame)
+        assert measurement["mode"] == MODE_NAMES[mode]
+        assert measurement["z_mag"] == columns["z_mag"][0]
+        assert measurement["phase_deg"] == columns["phase_deg"][0]
+        if math.isnan(columns["value"][0]):
+            assert "value" not in measurement
+        else:
+            assert math.isclose(measurement["value"], columns["value"][0], rel_tol=1e-12)
+
+
+def test_parse_measurement_rejects_bad_header():
+    frame = b"\x55" + frames(1.0)[1:]
+    assert parse_measurement(frame) is None
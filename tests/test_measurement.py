@@ -0,0 +1,22 @@
+import orjson
+
+from app.services.measurement import Device
+from tests.test_processing import frames
+
+
+def test_encoded_cache_follows_new_samples_and_clear():
+    device = Device("test")
+    device.record_batch(frames([1, 2, 3]))
+    first = device.get_measurements_json(limit=10)
+    assert device.get_measurements_json(limit=10) is first  # Served from the cache
+    assert [m["z_mag"] for m in orjson.loads(first)] == [1, 2, 3]
+
+    columnar = orjson.loads(device.get_measurements_json(limit=10, fmt="columnar"))
+    assert columnar["z"] == [1, 2, 3]
+
+    device.record_batch(frames([4]))
+    assert [m["z_mag"] for m in orjson.loads(device.get_measurements_json(limit=10))] == [1, 2, 3, 4]
+    assert [m["seq"] for m in orjson.loads(device.get_measurements_json(limit=10, since=2))] == [3]
+
+    device.clear_measurements()
+    assert orjson.loads(device.get_measurements_json(limit=10)) == []
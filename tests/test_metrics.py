@@ -0,0 +1,18 @@
+from prometheus_client import CollectorRegistry, generate_latest
+
+from app.services.metrics import SnapshotCounter
+
+
+def test_snapshot_counter_exposes_totals_as_counter():
+    registry = CollectorRegistry()
+    counter = SnapshotCounter("lcr_test_samples", "Samples", ["device"], registry)
+    counter.set(["a"], 5)
+    counter.set(["b"], 7)
+    counter.set(["a"], 6)
+    text = generate_latest(registry).decode()
+    assert "# TYPE lcr_test_samples_total counter" in text
+    assert 'lcr_test_samples_total{device="a"} 6.0' in text
+    assert 'lcr_test_samples_total{device="b"} 7.0' in text
+
+    counter.clear()
+    assert "device=" not in generate_latest(registry).decode()
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from app.services.measurement import Device
+from app.services.processing import ProcessingPipeline
+
+
+def frames(z_mags, flags=None):
+    n = len(z_mags)
+    return {
+        "timestamp": np.arange(n, dtype=np.float64),
+        "frequency": np.full(n, 1000.0),
+        "z_mag": np.asarray(z_mags, dtype=np.float32),
+        "phase_rad": np.zeros(n, dtype=np.float32),
+        "phase_deg": np.zeros(n),
+        "value": np.asarray(z_mags, dtype=np.float64),
+        "mode": np.full(n, 3, dtype=np.uint8),
+        "speed": np.ones(n, dtype=np.uint8),
+        "range": np.zeros(n, dtype=np.uint8),
+        "flags": np.zeros(n, dtype=np.uint8) if flags is None else np.asarray(flags, dtype=np.uint8),
+    }
+
+
+def test_boxcar_carries_partial_group_over():
+    pipeline = ProcessingPipeline("boxcar", decimate=4)
+    first = pipeline.process(frames([1, 2, 3, 4, 5, 6]))
+    assert first["z_mag"].tolist() == [2.5]
+    assert first["timestamp"].tolist() == [1.5]
+    assert pipeline.info()["pending"] == 2
+
+    second = pipeline.process(frames([7, 8]))
+    assert second["z_mag"].tolist() == [6.5]
+    assert second["value"].tolist() == [6.5]
+
+
+def test_median_and_plain_decimation():
+    assert ProcessingPipeline("median", decimate=3).process(frames([1, 9, 2]))["z_mag"].tolist() == [2.0]
+    assert ProcessingPipeline("none", decimate=3).process(frames([1, 9, 2]))["z_mag"].tolist() == [2.0]
+
+
+def test_reject_flags():
+    pipeline = ProcessingPipeline("boxcar", decimate=2, reject_flags=0x02)
+    out = pipeline.process(frames([1, 100, 3, 5, 7], flags=[0, 2, 0, 0, 0]))
+    assert out["z_mag"].tolist() == [2.0, 6.0]
+    assert pipeline.rejected == 1
+    assert out["flags"].tolist() == [0, 0]
+
+
+@pytest.mark.anyio
+async def test_config_change_keeps_pending_group():
+    device = Device("test")
+    await device.update_config({"processing": "boxcar", "decimate": 4})
+    device.record_batch(frames([1, 2, 3, 4, 5, 6]))
+    await device.update_config({"frequency": 2000, "rate": 5.0})
+    device.record_batch(frames([7, 8]))
+    assert device.measurement_data.window(0, 10)["z_mag"].tolist() == [2.5, 6.5]
+
+    await device.update_config({"decimate": 2})
+    assert device.processing.info()["pending"] == 0
@@ -0,0 +1,48 @@
+import math
+
+import numpy as np
+
+from app.services.sorting import Sorter
+
+
+def columns(z_mags, phase_rad=0.0, frequency=1000.0):
+    n = len(z_mags)
+    return {
+        "seq": np.arange(n),
+        "timestamp": np.arange(n, dtype=np.float64),
+        "frequency": np.full(n, frequency),
+        "z_mag": np.asarray(z_mags, dtype=np.float32),
+        "phase_rad": np.full(n, phase_rad, dtype=np.float32),
+    }
+
+
+def test_bins_and_yield():
+    sorter = Sorter(100.0, [5, 1], mode="Z")
+    sorter.evaluate(columns([100.5, 99.0, 104.0, 94.0, np.nan]))
+    info = sorter.info()
+    assert sorter.labels == ["±1%", "±5%", "fail", "invalid"]
+    assert info["counts"] == {"±1%": 2, "±5%": 1, "fail": 1, "invalid": 1}
+    assert info["yield"] == 0.6
+
+
+def test_sorts_derived_quantity():
+    # 1 µF capacitor at 1 kHz, measured in whatever mode the meter is in
+    z_mag = 1 / (2 * math.pi * 1000.0 * 1e-6)
+    sorter = Sorter(1e-6, [1], mode="C")
+    sorter.evaluate(columns([z_mag, z_mag * 1.05], phase_rad=-math.pi / 2))
+    assert sorter.info()["counts"] == {"±1%": 1, "fail": 1, "invalid": 0}
+
+    # A pure resistance has no series capacitance
+    sorter.evaluate(columns([z_mag], phase_rad=0.0))
+    assert sorter.info()["counts"]["invalid"] == 1
+
+
+def test_events_only_for_subscribers():
+    sorter = Sorter(100.0, [1], mode="Z")
+    sorter.evaluate(columns([100.0]))
+    queue = sorter.results.subscribe()
+    sorter.evaluate(columns([120.0]))
+    event = queue.get_nowait()
+    assert queue.empty()
+    assert event["bin"] == "fail" and not event["pass"]
+    assert sorter.info()["total"] == 2
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from app.services.statistics import MAX_TAU, STATS_BLOCK, STATS_WINDOW, ChannelStats, StatisticsEngine
+
+
+def overlapping_adev(x: np.ndarray, m: int) -> float:
+    sums = np.concatenate(([0.0], np.cumsum(x)))
+    averages = (sums[m:] - sums[:-m]) / m
+    d = averages[m:] - averages[:-m]
+    return float(np.sqrt((d @ d) / (2 * len(d))))
+
+
+def test_channel_matches_direct_computation():
+    rng = np.random.default_rng(7)
+    # Random walk on a large offset, fed in uneven blocks; longer than the 2 * MAX_TAU sums kept
+    x = 1e4 + np.cumsum(rng.normal(size=2 * MAX_TAU + 5000)) * 1e-3 + rng.normal(size=2 * MAX_TAU + 5000)
+    x[123] = np.nan  # Ignored
+    channel = ChannelStats()
+    edges = np.cumsum(rng.integers(1, 3 * STATS_BLOCK, size=len(x)))
+    for block in np.split(x, edges[edges < len(x)]):
+        channel.update(block)
+
+    valid = x[np.isfinite(x)]
+    summary = channel.summary(tau0=0.01)
+    assert summary["count"] == len(valid)
+    assert summary["mean"] == pytest.approx(valid.mean(), rel=1e-12)
+    assert summary["std"] == pytest.approx(valid.std(ddof=1), rel=1e-9)
+    assert (summary["min"], summary["max"], summary["last"]) == (valid.min(), valid.max(), valid[-1])
+
+    in_window = STATS_WINDOW + len(valid) % STATS_BLOCK
+    assert summary["window_min"] == valid[-in_window:].min()
+    assert summary["window_max"] == valid[-in_window:].max()
+
+    assert [point["tau"] for point in summary["allan"]] == [2**i for i in range(MAX_TAU.bit_length())]
+    for point in summary["allan"]:
+        assert point["adev"] == pytest.approx(overlapping_adev(valid, point["tau"]), rel=1e-6)
+        assert point["terms"] == len(valid) - 2 * point["tau"] + 1
+        assert point["tau_s"] == pytest.approx(point["tau"] * 0.01)
+
+
+def test_engine_summary_and_reset():
+    engine = StatisticsEngine()
+    for i in range(5):
+        engine.add({"z_mag": 100.0 + i, "phase_deg": 1.0, "value": np.nan}, 10.0 + 0.5 * i)
+    summary = engine.summary()
+    assert summary["samples"] == 5 and summary["sample_period"] == 0.5
+    assert summary["channels"]["z_mag"]["mean"] == 102.0
+    assert summary["channels"]["value"]["count"] == 0
+
+    engine.reset()
+    assert engine.summary()["channels"]["z_mag"]["count"] == 0
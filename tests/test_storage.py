@@ -0,0 +1,88 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services.storage import MeasurementStore
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def store(tmp_path, anyio_backend):
+    store = MeasurementStore(str(tmp_path / "history.db"), flush_interval=0.01)
+    await store.open()
+    yield store
+    await store.close()
+
+
+async def record(store: MeasurementStore, session_id: int, z_mags, t0: float = 1000.0) -> None:
+    for seq, z_mag in enumerate(z_mags):
+        store.add((session_id, seq, t0 + seq * 0.01, 1000.0, float(z_mag), 0.1, 3, 1, 0, 128))
+    while store.written < len(z_mags) or store.stats()["pending"]:
+        await asyncio.sleep(0.01)
+
+
+async def test_downsample_minmax_keeps_extremes(store):
+    session_id = await store.start_session("run", {"rate": 100})
+    z_mags = np.full(10_000, 100.0)
+    z_mags[1234], z_mags[8765] = 150.0, 50.0
+    await record(store, session_id, z_mags)
+
+    columns = await store.downsample(session_id, points=100, method="minmax")
+    assert len(columns["seq"]) <= 100
+    assert (np.diff(columns["timestamp"]) > 0).all()
+    assert {1234, 8765} <= set(columns["seq"].tolist())
+
+
+async def test_downsample_lttb_returns_requested_points(store):
+    session_id = await store.start_session(None, {})
+    await record(store, session_id, 100 + np.sin(np.arange(5000) / 100))
+    columns = await store.downsample(session_id, points=300, method="lttb")
+    assert len(columns["seq"]) == 300
+    assert columns["seq"][0] == 0 and columns["seq"][-1] == 4999
+
+
+async def test_downsample_time_range_and_empty_session(store):
+    session_id = await store.start_session(None, {})
+    await record(store, session_id, np.arange(1000))
+    columns = await store.downsample(session_id, start=1002.0, end=1004.0, points=1000)
+    assert columns["seq"].min() >= 200 and columns["seq"].max() <= 400
+    assert len((await store.downsample(session_id + 1))["seq"]) == 0
+
+
+async def test_query_by_session_and_time(store):
+    first = await store.start_session("first", {"rate": 10})
+    second = await store.start_session("second", {})
+    await record(store, first, [1.0, 2.0, 3.0])
+    await record(store, second, [4.0, 5.0], t0=2000.0)
+
+    columns = await store.query(session_id=first, start=1000.005)
+    assert columns["seq"].tolist() == [1, 2]
+    assert columns["z_mag"].tolist() == [2.0, 3.0]
+    assert columns["frequency"].dtype == np.float64
+    assert len((await store.query(end=1999.0))["seq"]) == 3
+
+    await store.stop_session(first)
+    sessions = {session["id"]: session for session in await store.list_sessions()}
+    assert sessions[first]["stopped_at"] is not None and sessions[second]["stopped_at"] is None
+    assert (await store.get_session(first))["config"] == {"rate": 10}
+
+
+async def test_close_flushes_pending_rows(tmp_path, anyio_backend):
+    path = str(tmp_path / "history.db")
+    store = MeasurementStore(path, flush_interval=60)
+    await store.open()
+    session_id = await store.start_session(None, {})
+    for seq in range(10):
+        store.add((session_id, seq, 1000.0 + seq, 1000.0, 100.0, 0.1, 3, 1, 0, 128))
+    assert store.stats()["pending"] + store.written <= 10
+    await store.close()
+    assert store.written == 10
+
+    store = MeasurementStore(path)
+    await store.open()
+    try:
+        assert len((await store.query(session_id=session_id))["seq"]) == 10
+    finally:
+        await store.close()
@@ -0,0 +1,55 @@
+import asyncio
+import math
+import time
+
+import numpy as np
+import pytest
+
+from app.services.sweep import SweepJob, average_point, sweep_frequencies
+
+pytestmark = pytest.mark.anyio
+
+
+def test_sweep_frequencies():
+    assert sweep_frequencies(100, 1000, 3, "log").tolist() == [100.0, 316.23, 1000.0]
+    assert sweep_frequencies(100, 200, 3).tolist() == [100.0, 150.0, 200.0]
+
+
+def test_mean_averages_complex_impedance():
+    # Phases either side of ±180° must not average to 0
+    columns = {
+        "z_mag": np.array([1.0, 1.0], dtype=np.float32),
+        "phase_rad": np.array([math.pi - 0.1, -math.pi + 0.1], dtype=np.float32),
+        "mode": np.array([3, 3], dtype=np.uint8),
+        "frequency": np.array([1000.0, 1000.0]),
+        "flags": np.array([0x80, 0x01], dtype=np.uint8),
+    }
+    point = average_point(columns, "mean")
+    assert abs(abs(point["phase_rad"]) - math.pi) < 1e-6
+    assert point["z_mag"] == pytest.approx(math.cos(0.1), rel=1e-6)
+    assert point["samples"] == 2 and point["flags"] == 0x81
+    assert average_point(columns, "median")["phase_rad"] == pytest.approx(0.0, abs=1e-6)
+
+
+async def test_sweep_points(meter):
+    job = SweepJob(meter, sweep_frequencies(10_000, 1_000_000, 5, "log"), samples_per_point=4)
+    await job.run()
+    assert job.status == "done"
+    assert [point["frequency"] for point in job.results] == [10000.0, 31622.78, 100000.0, 316227.77, 1000000.0]
+    assert all(point["samples"] == 4 for point in job.results)
+    # Series R-L: |Z| rises with frequency
+    assert all(a["z_mag"] < b["z_mag"] for a, b in zip(job.results, job.results[1:]))
+
+
+async def test_cancel_does_not_wait_out_settle_time(meter):
+    job = SweepJob(meter, sweep_frequencies(100, 1000, 3), settle=30.0)
+    task = asyncio.create_task(job.run())
+    await asyncio.sleep(0.1)
+    start = time.perf_counter()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert job.status == "cancelled"
+    # The port is free again straight away
+    assert await meter.send_command(64) == "E728"
+    assert time.perf_counter() - start < 0.5
@@ -0,0 +1,98 @@
+import time
+
+import pytest
+
+from app.services.transport import MAX_CONSECUTIVE_TIMEOUTS, RECONNECT_MIN_DELAY
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_read_measurement(meter):
+    measurement = await meter.read_measurement()
+    assert measurement["mode"] == "Z"
+    assert measurement["frequency"] == 1000.0
+    assert measurement["z_mag"] > 100.0
+
+
+async def test_pipelined_reads(meter):
+    columns = await meter.read_measurements(200, 8)
+    assert len(columns["z_mag"]) == 200
+    assert meter.skipped_bytes == 0
+
+
+async def test_resync_after_garbage(meter):
+    transport = meter.transport
+    # Stray bytes ahead of the reply, e.g. line noise
+    transport.serial._rx += b"\x00\x13"
+    assert await meter.send_command(64) == "E728"
+    assert transport.resyncs == 1
+    assert await meter.send_command(65) == "0001"
+    assert transport.resyncs == 1
+
+
+async def test_incomplete_reply_is_discarded(meter):
+    transport = meter.transport
+    transport.timeout = 0.05
+    transport.serial.timeout = 0.05
+    transport.serial.simulator.drop_rate = 1.0
+    assert await meter.read_measurement() is None
+    assert transport.timeouts == 1
+    transport.serial.simulator.drop_rate = 0.0
+    assert (await meter.read_measurement())["mode"] == "Z"
+
+
+async def test_frequency_is_rounded_to_centihertz(meter):
+    # 32.62 * 100 is 3261.9999999999995 in floating point
+    assert await meter.send_command(67, {"frequency": 32.62})
+    assert meter.transport.serial.simulator.frequency == 32.62
+
+
+async def test_pipelined_reads_with_byte_loss_do_not_wait_for_timeout(meter):
+    simulator = meter.transport.serial.simulator
+    simulator.drop_rate = 0.001
+    start = time.perf_counter()
+    frames = 0
+    for _ in range(20):
+        frames += len((await meter.read_measurements(64, 8))["z_mag"])
+    # A single read timeout would take a whole second
+    assert time.perf_counter() - start < 0.5
+    assert 1200 < frames < 1280
+    assert meter.skipped_bytes > 0
+
+
+async def test_lost_port_reconnects_with_backoff(meter, monkeypatch):
+    transport = meter.transport
+
+    def unplugged(data):
+        raise OSError("device disconnected")
+
+    monkeypatch.setattr(transport.serial, "write", unplugged)
+    assert await meter.read_measurement() is None
+    assert transport.lost and transport.io_errors == 1
+    assert not meter.is_connected
+
+    def fail_open(port, baudrate):
+        raise OSError("no such port")
+
+    transport.backoff = 0.01
+    monkeypatch.setattr(transport, "_open", fail_open)
+    assert not await transport.reconnect()
+    assert not await transport.reconnect()
+    assert transport.backoff == 0.04
+    monkeypatch.undo()
+
+    assert await transport.reconnect()
+    assert not transport.lost and transport.reconnects == 1
+    assert transport.backoff == RECONNECT_MIN_DELAY
+    assert (await meter.read_measurement())["mode"] == "Z"
+
+
+async def test_silent_port_is_marked_lost(meter):
+    transport = meter.transport
+    transport.timeout = 0.01
+    transport.serial.timeout = 0.01
+    transport.serial.simulator.drop_rate = 1.0
+    for _ in range(MAX_CONSECUTIVE_TIMEOUTS):
+        assert not transport.lost
+        assert await meter.read_measurement() is None
+    assert transport.lost and transport.timeouts == MAX_CONSECUTIVE_TIMEOUTS